@@ -0,0 +1,86 @@
+'''
+Construction benchmark of SndpGraph.
+
+Times SndpGraph() for a growing number of locations and reports the scaling exponent of every step,
+i.e., the slope of log(time) over log(num_locations): 1 is linear, 2 is quadratic.
+The number of routes grows quadratically with the locations, so the time per route shows
+whether the construction is linear in the size of the generated data.
+With --profile the largest graph is constructed once more under cProfile and the functions
+with the largest own time are listed, so the next hot spot is visible.
+
+Graphs with 10000+ locations need tens of GB, the route index is measured separately for them:
+--index-locations N compares the lookups in a dict of --index-routes routes among N locations
+keyed by the formatted 'start-end' strings (the former keys of SndpGraph._routes) and by the (start, end) tuples.
+
+Usage: python benchmarks/bench_construction.py [--num-locations 250 500 1000 2000] [--profile] [--index-locations 10000 40000]
+'''
+import argparse
+import cProfile
+import io
+import math
+import pstats
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sndpgen import SndpGraph
+
+
+def construct(num_locations, num_products):
+    with redirect_stdout(io.StringIO()): # progress bars
+        return SndpGraph('bench', num_locations, num_products, 1, random_seed=1)
+
+
+def index_lookups(num_locations, num_routes):
+    rng = random.Random(1)
+    pairs = [(rng.randint(1, num_locations), rng.randint(1, num_locations)) for _ in range(num_routes)]
+    timings = {}
+    for name, make_key in [('string', lambda start, end: '{}-{}'.format(start, end)), ('tuple', lambda start, end: (start, end))]:
+        index = {make_key(start, end): None for start, end in pairs}
+        start_time = time.perf_counter()
+        for start, end in pairs: # the same lookups as SndpGraph.get_route()
+            index.get(make_key(start, end))
+        timings[name] = (time.perf_counter() - start_time) / num_routes
+    return timings
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Construction benchmark of SndpGraph')
+    parser.add_argument('--num-locations', type=int, nargs='+', default=[250, 500, 1000, 2000])
+    parser.add_argument('--num-products', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=1, help='the best of repeat runs is reported')
+    parser.add_argument('--profile', action='store_true')
+    parser.add_argument('--index-locations', type=int, nargs='*', default=[])
+    parser.add_argument('--index-routes', type=int, default=1000000)
+    parsed = parser.parse_args(args)
+
+    print(f'{"locations":>10} {"routes":>8} {"time, s":>8} {"us/route":>9} {"exponent":>9}')
+    previous = None
+    for num_locations in parsed.num_locations:
+        elapsed = math.inf
+        for _ in range(parsed.repeat):
+            start = time.perf_counter()
+            graph = construct(num_locations, parsed.num_products)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        exponent = '' if previous is None else f'{math.log(elapsed / previous[1]) / math.log(num_locations / previous[0]):9.2f}'
+        num_routes = len(graph.get_routes())
+        print(f'{num_locations:>10} {num_routes:>8} {elapsed:8.3f} {elapsed / num_routes * 1e6:9.2f} {exponent:>9}')
+        previous = (num_locations, elapsed)
+
+    if parsed.index_locations:
+        print(f'{"locations":>10} {"string key, ns":>15} {"tuple key, ns":>14}')
+    for num_locations in parsed.index_locations:
+        timings = index_lookups(num_locations, parsed.index_routes)
+        print(f'{num_locations:>10} {timings["string"] * 1e9:15.0f} {timings["tuple"] * 1e9:14.0f}')
+
+    if parsed.profile:
+        profile = cProfile.Profile()
+        profile.runcall(construct, parsed.num_locations[-1], parsed.num_products)
+        pstats.Stats(profile).sort_stats('tottime').print_stats(15)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
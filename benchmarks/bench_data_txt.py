@@ -0,0 +1,70 @@
+'''
+Benchmark of the textual data cache of SndpGraph.
+
+For every number of locations the graph is generated and exported. Then the rows
+of the textual cache are replayed into the former str concatenation cache
+(self._data_txt[name] += row) and into the chunked cache (list.append() and ''.join() on export).
+
+Usage: python benchmarks/bench_data_txt.py [--num-locations 250 500 1000 2000] [--legacy-max-rows 500000]
+'''
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sndpgen import SndpGraph
+from sndpgen.sndp_graph import _format_data_row
+
+
+def replay_concatenation(rows_by_name):
+    data_txt = {name: '' for name in rows_by_name}
+    start = time.perf_counter()
+    for name, rows in rows_by_name.items():
+        for row in rows:
+            data_txt[name] += row
+    return time.perf_counter() - start
+
+
+def replay_chunks(rows_by_name):
+    data_txt = {name: [] for name in rows_by_name}
+    start = time.perf_counter()
+    for name, rows in rows_by_name.items():
+        for row in rows:
+            data_txt[name].append(row)
+    for name in rows_by_name:
+        ''.join(data_txt[name])
+    return time.perf_counter() - start
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Benchmark of the textual data cache of SndpGraph')
+    parser.add_argument('--num-locations', type=int, nargs='+', default=[250, 500, 1000, 2000])
+    parser.add_argument('--num-products', type=int, default=10)
+    parser.add_argument('--legacy-max-rows', type=int, default=500000,
+                        help='do not replay the str concatenation for bigger caches, it is quadratic')
+    parsed = parser.parse_args(args)
+
+    print(f'{"locations":>10} {"rows":>10} {"generate, s":>12} {"export, s":>10} {"concat, s":>10} {"chunks, s":>10}')
+    with tempfile.TemporaryDirectory() as directory:
+        for num_locations in parsed.num_locations:
+            start = time.perf_counter()
+            graph = SndpGraph('bench', num_locations, parsed.num_products, 1, random_seed=1)
+            generate_time = time.perf_counter() - start
+            start = time.perf_counter()
+            graph.export_mpl(str(Path(directory) / graph.name))
+            export_time = time.perf_counter() - start
+
+            rows_by_name = {name: [_format_data_row(row) for row in graph._data[name].values()] for name in ['ShipCost', 'ArcProduct', 'arc']}
+            num_rows = sum(len(rows) for rows in rows_by_name.values())
+            if num_rows <= parsed.legacy_max_rows:
+                concat_time = f'{replay_concatenation(rows_by_name):10.3f}'
+            else:
+                concat_time = f'{"skipped":>10}'
+            chunks_time = replay_chunks(rows_by_name)
+            print(f'{num_locations:>10} {num_rows:>10} {generate_time:12.3f} {export_time:10.3f} {concat_time} {chunks_time:10.3f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,35 @@
+'''
+Benchmark of the in-memory extensive form of SndpGraph.
+
+Reports the time to build the sparse constraint matrix for growing numbers of scenarios.
+
+Usage: python benchmarks/bench_extensive_form.py [--num-locations 40] [--num-products 20] [--num-scen 1 100 1000 10000]
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sndpgen import SndpGraph
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Benchmark of the in-memory extensive form of SndpGraph')
+    parser.add_argument('--num-locations', type=int, default=40)
+    parser.add_argument('--num-products', type=int, default=20)
+    parser.add_argument('--num-scen', type=int, nargs='+', default=[1, 100, 1000, 10000])
+    parsed = parser.parse_args(args)
+
+    graph = SndpGraph('bench', parsed.num_locations, parsed.num_products, 1, random_seed=1)
+    print(f'{"scenarios":>10} {"rows":>10} {"columns":>10} {"nonzeros":>10} {"build, s":>9}')
+    for num_scen in parsed.num_scen:
+        graph.regenerate_stochastic_data(num_scen)
+        start = time.perf_counter()
+        extensive_form = graph.extensive_form()
+        elapsed = time.perf_counter() - start
+        print(f'{num_scen:>10} {extensive_form.num_rows:>10} {extensive_form.num_cols:>10} {extensive_form.nnz:>10} {elapsed:9.3f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,57 @@
+'''
+Benchmark of SndpGraph.from_dat().
+
+For every number of locations the graph is generated and exported with export_mpl(). Then the .dat files
+are parsed: the time of parsing ArcProduct.dat alone and the time of from_dat() that builds the whole graph.
+The export of the parsed graph is compared with the original files.
+
+Usage: python benchmarks/bench_from_dat.py [--num-locations 250 500 1000 2000]
+'''
+import argparse
+import filecmp
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sndpgen import SndpGraph
+from sndpgen.sndp_graph import _read_array_dat
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Benchmark of SndpGraph.from_dat()')
+    parser.add_argument('--num-locations', type=int, nargs='+', default=[250, 500, 1000, 2000])
+    parser.add_argument('--num-products', type=int, default=10)
+    parser.add_argument('--num-scen', type=int, default=100)
+    parsed = parser.parse_args(args)
+
+    data_item_names = ['MaterialReq', 'Prob', 'Demand', 'ShipCost', 'ArcProduct', 'arc']
+    print(f'{"locations":>10} {"ArcProduct, MB":>15} {"parse, s":>9} {"MB/s":>6} {"from_dat, s":>12} {"generate, s":>12} {"same files":>11}')
+    with tempfile.TemporaryDirectory() as directory:
+        for num_locations in parsed.num_locations:
+            prefix = str(Path(directory) / f'bench_{num_locations}')
+            start = time.perf_counter()
+            graph = SndpGraph('bench', num_locations, parsed.num_products, parsed.num_scen, random_seed=1)
+            generate_time = time.perf_counter() - start
+            graph.export_mpl(prefix)
+            del graph
+
+            arc_product_file = Path(f'{prefix}_ArcProduct.dat')
+            start = time.perf_counter()
+            _read_array_dat(arc_product_file, 'ArcProduct')
+            parse_time = time.perf_counter() - start
+            size = arc_product_file.stat().st_size / 2**20
+
+            start = time.perf_counter()
+            graph = SndpGraph.from_dat(prefix)
+            from_dat_time = time.perf_counter() - start
+            graph.export_mpl(prefix + '_parsed')
+            same_files = all(filecmp.cmp(f'{prefix}_{name}.dat', f'{prefix}_parsed_{name}.dat', shallow=False)
+                             for name in data_item_names + ['ScalarData'])
+            del graph
+            print(f'{num_locations:>10} {size:15.1f} {parse_time:9.3f} {size / parse_time:6.1f} {from_dat_time:12.3f} {generate_time:12.3f} {str(same_files):>11}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
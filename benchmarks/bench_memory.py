@@ -0,0 +1,56 @@
+'''
+Memory benchmark of SndpGraph.
+
+Reports the memory allocated by the generated graph (tracemalloc), the peak during
+the generation and the additional peak during export_mpl() for the default and the compact graph.
+The default graph is exported as is and with streaming=True, the compact graph is always streamed.
+
+Usage: python benchmarks/bench_memory.py [--num-locations 250 500 1000]
+'''
+import argparse
+import gc
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sndpgen import SndpGraph
+
+
+def measure(num_locations, num_products, streaming, **kwargs):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    graph = SndpGraph('bench', num_locations, num_products, 1, random_seed=1, **kwargs)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    with tempfile.TemporaryDirectory() as directory:
+        graph.export_mpl(str(Path(directory) / graph.name), streaming=streaming)
+    export_peak = tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    num_rows = len(graph._data['ArcProduct'])
+    del graph
+    return num_rows, elapsed, current, peak, export_peak
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Memory benchmark of SndpGraph')
+    parser.add_argument('--num-locations', type=int, nargs='+', default=[250, 500, 1000])
+    parser.add_argument('--num-products', type=int, default=10)
+    parsed = parser.parse_args(args)
+
+    modes = {'default': (False, {}), 'stream': (True, {}), 'compact': (True, {'compact': True})}
+
+    print(f'{"mode":>8} {"locations":>10} {"ArcProduct":>11} {"generate, s":>12} {"graph, MB":>10} {"peak, MB":>9} {"export, MB":>11}')
+    for num_locations in parsed.num_locations:
+        for mode, (streaming, kwargs) in modes.items():
+            num_rows, elapsed, current, peak, export_peak = measure(num_locations, parsed.num_products, streaming, **kwargs)
+            print(f'{mode:>8} {num_locations:>10} {num_rows:>11} {elapsed:12.3f} {current/2**20:10.1f} {peak/2**20:9.1f} {export_peak/2**20:11.1f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
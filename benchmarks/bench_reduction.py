@@ -0,0 +1,58 @@
+'''
+Benchmark of the scenario reduction.
+
+Reports the time of sndp_reduction.reduce_scenarios() and of SndpGraph.export_reduced_mpl() for the instances
+with many scenarios and the quality of the reduction: the mean absolute difference between the demand
+of a scenario and the demand of its representative, relative to the demand range.
+
+Usage: python benchmarks/bench_reduction.py [--num-scen 10000 100000] [--reduced-num-scen 10 50 200]
+'''
+import argparse
+import sys
+import tempfile
+import time
+from bisect import bisect_right
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sndpgen import SndpGraph
+from sndpgen.sndp_reduction import reduce_scenarios
+
+
+def relative_error(probabilities, demands, reduced_demands):
+    # the representative of a scenario is the closest reduced demand
+    error = 0
+    for probability, demand in zip(probabilities, demands):
+        i = bisect_right(reduced_demands, demand)
+        error += probability * min(abs(demand - reduced_demands[j]) for j in (i - 1, i) if 0 <= j < len(reduced_demands))
+    return error / (max(demands) - min(demands))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Benchmark of the scenario reduction')
+    parser.add_argument('--num-scen', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--reduced-num-scen', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--num-locations', type=int, default=10)
+    parsed = parser.parse_args(args)
+
+    graph = SndpGraph('bench', parsed.num_locations, 5, 1, random_seed=1)
+    print(f'{"scenarios":>10} {"reduced":>8} {"reduce, s":>10} {"export, s":>10} {"error":>8}')
+    for num_scen in parsed.num_scen:
+        graph.regenerate_stochastic_data(num_scen, demand_type=SndpGraph.STR_DEMAND_REPEATED)
+        probabilities = [scenario.probability for scenario in graph.get_scenarios()]
+        demands = [scenario.demand for scenario in graph.get_scenarios()]
+        with tempfile.TemporaryDirectory() as directory:
+            graph.export_mpl(str(Path(directory) / graph.name))
+            for reduced_num_scen in parsed.reduced_num_scen:
+                start = time.perf_counter()
+                _, reduced_demands = reduce_scenarios(probabilities, demands, reduced_num_scen)
+                reduce_time = time.perf_counter() - start
+                start = time.perf_counter()
+                graph.export_reduced_mpl(str(Path(directory) / f'{graph.name}_reduced{reduced_num_scen}'), reduced_num_scen)
+                export_time = time.perf_counter() - start
+                error = relative_error(probabilities, demands, reduced_demands)
+                print(f'{num_scen:>10} {reduced_num_scen:>8} {reduce_time:10.3f} {export_time:10.3f} {error:8.4f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
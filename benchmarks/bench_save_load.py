@@ -0,0 +1,47 @@
+'''
+Benchmark of SndpGraph.save() and SndpGraph.load().
+
+For every number of locations the graph is generated, saved to the binary snapshot and loaded.
+read_snapshot() only maps the arrays of the file, load() builds the graph from them.
+
+Usage: python benchmarks/bench_save_load.py [--num-locations 250 500 1000 2000]
+'''
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sndpgen import SndpGraph
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Benchmark of SndpGraph.save() and SndpGraph.load()')
+    parser.add_argument('--num-locations', type=int, nargs='+', default=[250, 500, 1000, 2000])
+    parser.add_argument('--num-products', type=int, default=10)
+    parsed = parser.parse_args(args)
+
+    print(f'{"locations":>10} {"file, MB":>9} {"generate, s":>12} {"save, s":>8} {"read, ms":>9} {"load, s":>8}')
+    with tempfile.TemporaryDirectory() as directory:
+        for num_locations in parsed.num_locations:
+            path = Path(directory) / f'bench_{num_locations}.sndp'
+            start = time.perf_counter()
+            graph = SndpGraph('bench', num_locations, parsed.num_products, 1, random_seed=1)
+            generate_time = time.perf_counter() - start
+            start = time.perf_counter()
+            graph.save(path)
+            save_time = time.perf_counter() - start
+            del graph
+            start = time.perf_counter()
+            header, arrays = SndpGraph.read_snapshot(path)
+            read_time = time.perf_counter() - start
+            del header, arrays
+            start = time.perf_counter()
+            SndpGraph.load(path)
+            load_time = time.perf_counter() - start
+            print(f'{num_locations:>10} {path.stat().st_size/2**20:9.1f} {generate_time:12.3f} {save_time:8.3f} {read_time*1000:9.3f} {load_time:8.3f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
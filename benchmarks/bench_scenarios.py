@@ -0,0 +1,52 @@
+'''
+Benchmark of the scenario generation of SndpGraph.
+
+Compares regenerate_stochastic_data() that draws all demands at once and formats Prob.dat and Demand.dat
+as one block with adding the same scenarios one by one with add_scenario(). The export of the
+stochastic data is timed as well. Large num_scen need repeated or float demands, see SndpGraph.STR_DEMAND_*.
+
+Usage: python benchmarks/bench_scenarios.py [--num-scen 10000 100000 1000000] [--demand-type repeated]
+'''
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sndpgen import SndpGraph
+from sndpgen.sndp_graph import _Scenario
+
+
+def per_row(graph, num_scen):
+    scenarios = graph.get_scenarios()
+    graph._clear_stochastic_data_cache()
+    start = time.perf_counter()
+    for scenario in scenarios:
+        graph.add_scenario(_Scenario(scenario.id, scenario.probability, scenario.demand))
+    return time.perf_counter() - start
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Benchmark of the scenario generation of SndpGraph')
+    parser.add_argument('--num-scen', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--demand-type', default=SndpGraph.STR_DEMAND_REPEATED,
+                        choices=[SndpGraph.STR_DEMAND_UNIQUE, SndpGraph.STR_DEMAND_REPEATED, SndpGraph.STR_DEMAND_FLOAT])
+    parser.add_argument('--num-locations', type=int, default=10)
+    parsed = parser.parse_args(args)
+
+    graph = SndpGraph('bench', parsed.num_locations, 5, 1, random_seed=1)
+    print(f'{"scenarios":>10} {"batched, s":>11} {"per row, s":>11} {"export, s":>10}')
+    for num_scen in parsed.num_scen:
+        start = time.perf_counter()
+        graph.regenerate_stochastic_data(num_scen, demand_type=parsed.demand_type)
+        batched = time.perf_counter() - start
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            graph.export_mpl(str(Path(directory) / graph.name))
+            export = time.perf_counter() - start
+        print(f'{num_scen:>10} {batched:11.3f} {per_row(graph, num_scen):11.3f} {export:10.3f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
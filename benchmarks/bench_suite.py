@@ -0,0 +1,217 @@
+'''
+Benchmark suite of sndpgen with stored baselines.
+
+Times and memory-profiles SndpGraph(), regenerate_stochastic_data(), export_mpl(), data_as_dict() and random_subset()
+on a grid of locations, products and scenarios. Time is the average of enough calls to run FLOAT_MIN_TIME seconds,
+memory is the tracemalloc peak of one more call above the memory before the call.
+Every benchmark also gets a complexity slope per parameter: the least squares slope of log(time) over log(parameter)
+with the other parameters fixed, 1 is linear, 2 is quadratic.
+
+--save-baseline FILE stores the results as json, --compare FILE reports the changes against a stored baseline
+and exits with 1 on a regression: time or memory above (1 + tolerance) of the baseline, or a slope
+that grew by more than FLOAT_SLOPE_TOLERANCE. Timings depend on the machine, compare the baselines made on the same machine.
+benchmarks/baselines/quick.json is the baseline of the quick grid.
+
+Grids: quick (default) - locations 10 100 1000, products 5 20, scenarios 1 1000;
+full - locations 10 100 1000 10000, products 5 20 40, scenarios 1 1000 100000. The graphs with 10000 locations need tens of GB.
+
+Usage: python benchmarks/bench_suite.py [--grid quick|full] [--benchmarks init export_mpl ...] [--save-baseline FILE] [--compare FILE]
+'''
+import argparse
+import io
+import json
+import math
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sndpgen import SndpGraph, __version__
+from sndpgen.sndp_graph import random_subset
+
+FLOAT_MIN_TIME = 0.05 # sec, fast calls are repeated at least that long
+INT_MAX_NUMBER = 1000 # calls
+FLOAT_TOLERANCE = 0.25 # relative increase of time or memory reported as a regression
+FLOAT_MIN_DIFFERENCE = 0.001 # sec, smaller changes of time are noise
+FLOAT_SLOPE_TOLERANCE = 0.3
+FLOAT_MIN_SLOPE_TIME = 0.005 # sec, slopes of the faster calls are noise
+GRIDS = {'quick': {'num_locations': [10, 100, 1000], 'num_products': [5, 20], 'num_scen': [1, 1000]},
+         'full': {'num_locations': [10, 100, 1000, 10000], 'num_products': [5, 20, 40], 'num_scen': [1, 1000, 100000]}}
+BENCHMARKS = ['init', 'regenerate_stochastic_data', 'export_mpl', 'data_as_dict', 'random_subset']
+
+
+def measure(function, setup = None):
+
+    '''(average time of a call, tracemalloc peak of a call). setup() returns the arguments of function() and is not measured'''
+
+    def run(number):
+        elapsed = 0
+        for _ in range(number):
+            args = setup() if setup is not None else ()
+            start = time.perf_counter()
+            function(*args)
+            elapsed += time.perf_counter() - start
+        return elapsed / number
+
+    with redirect_stdout(io.StringIO()): # messages of SndpGraph
+        elapsed = run(1)
+        if elapsed < FLOAT_MIN_TIME:
+            elapsed = run(min(INT_MAX_NUMBER, math.ceil(FLOAT_MIN_TIME / max(elapsed, 1e-7))))
+        args = setup() if setup is not None else ()
+        tracemalloc.start()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        function(*args)
+        memory_peak = tracemalloc.get_traced_memory()[1] - start_memory
+        tracemalloc.stop()
+    return elapsed, memory_peak
+
+
+def invalidate_exports(graph):
+    # export_mpl() does not write again the .dat files that are actual
+    for name in graph._data_valid_export:
+        graph._data_valid_export[name] = None
+    return ()
+
+
+def run_benchmarks(grid, benchmarks):
+    results = []
+
+    def record(benchmark, params, elapsed, memory_peak):
+        results.append({'benchmark': benchmark, 'params': params, 'time': elapsed, 'memory_peak': memory_peak})
+        params_text = ' '.join(f'{name}={value}' for name, value in params.items())
+        print(f'{benchmark:>27} {params_text:<48} {elapsed:10.5f} {memory_peak / 2**20:9.2f}', flush=True)
+
+    print(f'{"benchmark":>27} {"params":<48} {"time, s":>10} {"peak, MB":>9}')
+    for num_locations in grid['num_locations']:
+        if 'random_subset' in benchmarks:
+            rng = random.Random(1)
+            items = range(num_locations)
+            record('random_subset', {'num_locations': num_locations},
+                   *measure(lambda: random_subset(items, num_locations // 2, rng)))
+        if not set(benchmarks) & {'init', 'regenerate_stochastic_data', 'export_mpl', 'data_as_dict'}:
+            continue
+        for num_products in grid['num_products']:
+            params = {'num_locations': num_locations, 'num_products': num_products}
+            if 'init' in benchmarks:
+                record('init', params, *measure(lambda: SndpGraph('bench', num_locations, num_products, 1, random_seed=1)))
+            with redirect_stdout(io.StringIO()):
+                graph = SndpGraph('bench', num_locations, num_products, 1, random_seed=1)
+            with tempfile.TemporaryDirectory() as directory:
+                filename = str(Path(directory) / 'bench')
+                for num_scen in grid['num_scen']:
+                    scen_params = dict(params, num_scen=num_scen)
+                    regenerate = lambda: graph.regenerate_stochastic_data(num_scen, demand_type=SndpGraph.STR_DEMAND_REPEATED)
+                    if 'regenerate_stochastic_data' in benchmarks:
+                        record('regenerate_stochastic_data', scen_params, *measure(regenerate))
+                    else:
+                        measure(regenerate)
+                    if 'export_mpl' in benchmarks:
+                        record('export_mpl', scen_params, *measure(lambda: graph.export_mpl(filename), lambda: invalidate_exports(graph)))
+                    if 'data_as_dict' in benchmarks:
+                        record('data_as_dict', scen_params, *measure(lambda: graph.data_as_dict))
+            del graph
+    return results
+
+
+def complexity_slopes(results):
+
+    '''{(benchmark, parameter, fixed params as text): slope} for every parameter with at least two values
+    if the slowest of the calls takes at least FLOAT_MIN_SLOPE_TIME'''
+
+    slopes = {}
+    groups = {}
+    for result in results:
+        for parameter in result['params']:
+            fixed = ' '.join(f'{name}={value}' for name, value in result['params'].items() if name != parameter)
+            groups.setdefault((result['benchmark'], parameter, fixed), []).append((result['params'][parameter], result['time']))
+    for key, points in groups.items():
+        points = [(math.log(value), math.log(elapsed)) for value, elapsed in points if value > 0 and elapsed > 0]
+        if len({x for x, _ in points}) < 2 or max(y for _, y in points) < math.log(FLOAT_MIN_SLOPE_TIME):
+            continue
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        slopes[key] = (sum((x - mean_x) * (y - mean_y) for x, y in points) /
+                       sum((x - mean_x) ** 2 for x, _ in points))
+    return slopes
+
+
+def print_slopes(slopes):
+    print(f'{"benchmark":>27} {"parameter":>14} {"fixed":<36} {"slope":>6}')
+    for (benchmark, parameter, fixed), slope in slopes.items():
+        print(f'{benchmark:>27} {parameter:>14} {fixed:<36} {slope:6.2f}')
+
+
+def compare(results, slopes, baseline, tolerance):
+
+    '''Print the changes against the baseline, return the number of regressions'''
+
+    def case_key(result):
+        return result['benchmark'], tuple(sorted(result['params'].items()))
+
+    baseline_results = {case_key(result): result for result in baseline['results']}
+    regressions = 0
+    print(f'{"benchmark":>27} {"params":<48} {"time":>7} {"memory":>7}')
+    for result in results:
+        previous = baseline_results.get(case_key(result))
+        if previous is None:
+            continue
+        time_ratio = result['time'] / previous['time']
+        memory_ratio = result['memory_peak'] / previous['memory_peak'] if previous['memory_peak'] else 1.0
+        slower = time_ratio > 1 + tolerance and result['time'] - previous['time'] > FLOAT_MIN_DIFFERENCE
+        larger = memory_ratio > 1 + tolerance
+        regressions += slower + larger
+        params_text = ' '.join(f'{name}={value}' for name, value in result['params'].items())
+        flag = ' REGRESSION' if slower or larger else ''
+        print(f'{result["benchmark"]:>27} {params_text:<48} {time_ratio:6.2f}x {memory_ratio:6.2f}x{flag}')
+
+    baseline_slopes = {(slope['benchmark'], slope['parameter'], slope['fixed']): slope['slope'] for slope in baseline['slopes']}
+    for key, slope in slopes.items():
+        if key in baseline_slopes and slope > baseline_slopes[key] + FLOAT_SLOPE_TOLERANCE:
+            regressions += 1
+            print(f'REGRESSION: slope of {key[0]} over {key[1]} ({key[2]}) grew from {baseline_slopes[key]:.2f} to {slope:.2f}')
+    return regressions
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Benchmark suite of sndpgen with stored baselines')
+    parser.add_argument('--grid', choices=list(GRIDS), default='quick')
+    parser.add_argument('--num-locations', type=int, nargs='+', help='overrides the grid')
+    parser.add_argument('--num-products', type=int, nargs='+', help='overrides the grid')
+    parser.add_argument('--num-scen', type=int, nargs='+', help='overrides the grid')
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--save-baseline', type=str, metavar='FILE')
+    parser.add_argument('--compare', type=str, metavar='FILE')
+    parser.add_argument('--tolerance', type=float, default=FLOAT_TOLERANCE)
+    parsed = parser.parse_args(args)
+
+    grid = dict(GRIDS[parsed.grid])
+    for name in grid:
+        if getattr(parsed, name) is not None:
+            grid[name] = getattr(parsed, name)
+
+    results = run_benchmarks(grid, parsed.benchmarks)
+    slopes = complexity_slopes(results)
+    print_slopes(slopes)
+
+    if parsed.save_baseline is not None:
+        baseline = {'date': datetime.now().isoformat(timespec='seconds'), 'version': __version__,
+                    'python': platform.python_version(), 'machine': platform.platform(), 'grid': grid,
+                    'results': results,
+                    'slopes': [{'benchmark': benchmark, 'parameter': parameter, 'fixed': fixed, 'slope': slope}
+                               for (benchmark, parameter, fixed), slope in slopes.items()]}
+        Path(parsed.save_baseline).write_text(json.dumps(baseline, indent=1))
+    if parsed.compare is not None:
+        regressions = compare(results, slopes, json.loads(Path(parsed.compare).read_text()), parsed.tolerance)
+        print(f'{regressions} regressions')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
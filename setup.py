@@ -16,7 +16,7 @@ long_description = """
 
 setup(name='sndpgen',
       version='0.0.1',
-      python_requires='>=3.6', # does not work for some reason
+      python_requires='>=3.9', # does not work for some reason
       description='Converter for mathematical optimization formats: .mpl, .lp, .mps -> .mps, .lp, .xa, .mpl, mod etc.',
       long_description=long_description,
       keywords='converter mathematical optimization mps',
@@ -31,10 +31,9 @@ setup(name='sndpgen',
         'Natural Language :: English',
         'Operating System :: Microsoft :: Windows',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
-        'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'Topic :: Scientific/Engineering :: Mathematics',
         ],
       include_package_data=True, # files from MANIFEST.in
@@ -1,3 +1,5 @@
+__version__ = '0.0.1'
+
 from sndpgen.sndp_graph import SndpGraph, Timer
-from sndpgen.command_line import parse_args_sndp_gen, generate_command, adjust_command
-import sndpgen.sndp_model
\ No newline at end of file
+from sndpgen.sndp_extensive_form import SndpExtensiveForm
+from sndpgen.command_line import parse_args_sndp_gen, generate_command, adjust_command
\ No newline at end of file
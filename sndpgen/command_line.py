@@ -1,13 +1,35 @@
 import argparse
+import hashlib
+import json
+import os
 import sys
+import threading
+from contextlib import nullcontext
 from pathlib import Path
-import yaml
-from sndpgen import SndpGraph
+from sndpgen import SndpGraph, __version__
+from sndpgen.sndp_cache import SndpCache
+from sndpgen.sndp_graph import render_visualization
+from sndpgen.sndp_profile import Profiler, profiled, span, progress_callback, set_progress_callback
+
+STR_MANIFEST_FILENAME = 'sndp_gen_manifest.json' # inputs and output file hashes of the generated combinations
+INT_VISUALIZATION_WORKERS = 2 # threads that render the visualizations, graphviz renders every one in a subprocess
+INT_MAX_PENDING_VISUALIZATIONS = 16 # generation waits if that many visualizations are not rendered yet
+
+def progress_bar(task: str, current: int, total: int, barLength = 20):
+    percent = float(current) * 100 / total
+    arrow   = '-' * int(percent/100 * barLength - 1) + '>'
+    spaces  = ' ' * (barLength - len(arrow))
+    bar_str = f'{task}: [{arrow}{spaces}] {current}/{total}'
+    if SndpGraph.DEBUG and (current / 1).is_integer(): # end='r' does not work in PyCharm
+        print(bar_str, end='\n')
+    else:
+        print(bar_str, end='\r')
+
 
 def parse_args_sndp_gen(args):
 
     parser = argparse.ArgumentParser(prog='sndpgen',
-                                     description='sndpgen generates .cor, .tim, .cor files of Stochastic Network Design Problems for the specifc number of locations, products and scenarios.')
+                                     description='sndpgen generates .mpl and .dat files (and .cor, .tim, .sto files with --smps) of Stochastic Network Design Problems for the specifc number of locations, products and scenarios.')
 
     parser.add_argument('--yaml', type=str, default='param.yaml', action='store',
                         help='''yaml file with the parameters of SNDP problems to generate: number of locations, products etc. Filename should include the extension. Default: param.yaml\n
@@ -28,7 +50,22 @@ num_scen:\n
     - 1000\n
     - 10000\n
 num_variations: 3\n
+nested_scenarios: false # optional, true - scenarios of the smaller num_scen are kept in the larger ones\n
+reduced_num_scen: 50 # optional, instances with more scenarios are also exported with 50 representative scenarios\n
 ''')
+    parser.add_argument('--jobs', type=int, default=1, action='store',
+                        help='number of worker processes that generate the (num_locations, num_products, variation) combinations in parallel. Default: 1')
+    parser.add_argument('--smps', action='store_true',
+                        help='export the instances also in SMPS format: .cor, .tim, .sto files')
+    parser.add_argument('--force', action='store_true',
+                        help=f'generate all the combinations. By default, the combinations that did not change since the last run according to {STR_MANIFEST_FILENAME} are skipped')
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f'do not use the cache of the core data in {SndpCache.STR_DEFAULT_DIRECTORY} folder, always generate the core data')
+    parser.add_argument('--profile', type=str, default=None, action='store', metavar='FILE',
+                        help='write the wall time, CPU time and number of runs of every phase (core data, stochastic data, export etc.) to FILE as json. '
+                             'The phases of all the combinations and worker processes are summed up')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='with --profile, also trace the memory peak of every phase with tracemalloc. Slows the generation down')
 
     return parser.parse_args(args)
 
@@ -36,6 +73,7 @@ num_variations: 3\n
 def read_parameters(yaml_filename):
     yaml_file = Path(yaml_filename)
     if yaml_file.is_file():
+        import yaml # not needed to import sndpgen
         with open(yaml_file.resolve()) as file:
             try:
                 return yaml.safe_load(file)
@@ -43,6 +81,231 @@ def read_parameters(yaml_filename):
                 print(e)
 
 
+def instance_prefix(num_locations, num_products, variation):
+    return 'SNDP_{}_{}_{}_'.format(num_locations, num_products, variation)
+
+
+@profiled('generate_instances')
+def generate_instances(num_locations, num_products, variation, list_num_scen, smps=False, cache=None, nested=False,
+                       reduced_num_scen=None, visualizations=None):
+
+    '''
+    Generate the instances of one (num_locations, num_products, variation) combination for all list_num_scen.
+    Combinations are independent from each other: the graph is seeded with the variation,
+    so the output does not depend on the process that runs this function.
+
+    :param smps: export the instances also in SMPS format. The core is written once for all list_num_scen.
+    :param cache: SndpCache of the core data or None
+    :param nested: the scenarios of every instance are the first scenarios of the next instance with a larger num_scen,
+        see SndpGraph.extend_scenarios()
+    :param reduced_num_scen: every instance with more scenarios is also exported with reduced_num_scen representative scenarios,
+        see reduced_instance_name() and SndpGraph.export_reduced_mpl(). None - no reduced instances
+    :param visualizations: list to append (SndpGraph.visualization_data(), file name) of the visualization to
+        instead of rendering it right away, see BackgroundRenderer. None - render with SndpGraph.visualize()
+    :return: instance name without the number of scenarios
+    '''
+
+    num_scen = list_num_scen[0]  # generate instance for the first num_scen in the list_num_scen
+    instance_name = instance_prefix(num_locations, num_products, variation)
+    graph = SndpGraph(instance_name + str(num_scen), num_locations, num_products, num_scen, random_seed=variation, cache=cache)
+    graph.adjust_sales_price()
+    if num_locations <= SndpGraph.INT_MAX_LOCATIONS_TO_VISUALIZE:
+        if visualizations is None:
+            graph.visualize(to_file=instance_name)
+        else:
+            visualizations.append((graph.visualization_data(), instance_name))
+    # We change only stochastic data for this instances.
+    # We could initilize SNDP_Graph() for every num_scen but since random_seed
+    # stays the same, the core data will also be the same
+    for i, num_scen in enumerate(list_num_scen):
+        if i > 0:
+            if nested and num_scen >= list_num_scen[i - 1]:
+                graph.extend_scenarios(num_scen)
+            else:
+                graph.regenerate_stochastic_data(num_scen)
+        graph.export_mpl(instance_name + str(num_scen))
+        if smps:
+            graph.export_smps(instance_name + str(num_scen))
+        if reduced_num_scen is not None and num_scen > reduced_num_scen:
+            graph.export_reduced_mpl(reduced_instance_name(instance_name, num_scen, reduced_num_scen), reduced_num_scen)
+
+    return instance_name
+
+
+def reduced_instance_name(instance_name, num_scen, reduced_num_scen):
+    return f'{instance_name}{num_scen}_reduced{reduced_num_scen}'
+
+
+def instance_inputs(num_locations, num_products, variation, list_num_scen, smps=False, nested=False, reduced_num_scen=None):
+
+    '''Everything that defines the files of generate_instances(), see STR_MANIFEST_FILENAME.'''
+
+    # settings of SndpGraph that change the data. Visualization is listed separately, export settings do not change the files
+    settings = {name: value for name, value in vars(SndpGraph).items() if name.startswith(('INT_', 'FLOAT_'))
+                and name not in ('INT_MAX_LOCATIONS_TO_VISUALIZE', 'INT_EXPORT_CHUNK_ROWS', 'INT_EXPORT_BUFFER_SIZE')}
+    return {'num_locations': num_locations, 'num_products': num_products, 'variation': variation,
+            'list_num_scen': list(list_num_scen), 'smps': smps, 'nested_scenarios': nested,
+            'reduced_num_scen': reduced_num_scen, 'random_seed': variation,
+            'visualize': num_locations <= SndpGraph.INT_MAX_LOCATIONS_TO_VISUALIZE,
+            'version': __version__, 'settings': settings}
+
+
+def visualization_files(num_locations, num_products, variation):
+
+    '''Existing files of the visualization: dot source and the image'''
+
+    instance_name = instance_prefix(num_locations, num_products, variation)
+    return sorted(file for file in [Path(instance_name)] + list(Path().glob(instance_name + '.*')) if file.is_file())
+
+
+def instance_files(num_locations, num_products, variation, list_num_scen, visualization=True):
+
+    '''Existing files written by generate_instances(): .mpl, .dat, SMPS files of every num_scen, reduced instances and the visualization'''
+
+    instance_name = instance_prefix(num_locations, num_products, variation)
+    files = visualization_files(num_locations, num_products, variation) if visualization else []
+    for num_scen in list_num_scen:
+        files += list(Path().glob(f'{instance_name}{num_scen}.*')) + list(Path().glob(f'{instance_name}{num_scen}_*.dat'))
+        files += list(Path().glob(f'{reduced_instance_name(instance_name, num_scen, "*")}.mpl'))
+    return sorted(files)
+
+
+def file_hash(file):
+    sha256 = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def file_hashes(files):
+
+    '''{file: {'sha256', 'size', 'mtime_ns'}} for the manifest. The file is stated before it is hashed,
+    so a change during the hashing changes mtime_ns'''
+
+    hashes = {}
+    for file in files:
+        stat = Path(file).stat()
+        hashes[str(file)] = {'sha256': file_hash(file), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    return hashes
+
+
+def is_up_to_date(manifest_entry, inputs):
+
+    '''True if the combination was generated with the same inputs and its files were not changed since.
+    Only the files with another mtime than in the manifest are hashed, their new mtime is recorded in manifest_entry
+    if the hash did not change.'''
+
+    if manifest_entry is None or manifest_entry.get('inputs') != inputs:
+        return False
+    files = manifest_entry.get('files', {})
+    if not files:
+        return False
+    for file, recorded in files.items():
+        if not isinstance(recorded, dict): # manifest of an older version with the hashes only
+            return False
+        try:
+            stat = Path(file).stat()
+        except FileNotFoundError:
+            return False
+        if stat.st_size != recorded['size']:
+            return False
+        if stat.st_mtime_ns != recorded['mtime_ns']:
+            if file_hash(file) != recorded['sha256']:
+                return False
+            recorded['mtime_ns'] = stat.st_mtime_ns # e.g., the file was copied or touched
+    return True
+
+
+def read_manifest():
+    try:
+        return json.loads(Path(STR_MANIFEST_FILENAME).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_manifest(manifest):
+    # temporary file and rename: the manifest is not broken if the generation is interrupted
+    temp_file = Path(STR_MANIFEST_FILENAME + '.tmp')
+    temp_file.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(temp_file, STR_MANIFEST_FILENAME)
+
+
+def generate_and_hash_instances(num_locations, num_products, variation, list_num_scen, smps=False, cache=None, nested=False,
+                                reduced_num_scen=None, profile=False, trace_memory=False):
+
+    '''generate_instances() and the hashes of the generated files for the manifest. Hashing runs in the worker process.
+    The visualization is not rendered, its data is returned for BackgroundRenderer.
+
+    :param profile: measure the phases with an own Profiler, e.g., in a worker process.
+        Without it, the phases are added to the active Profiler of the thread, if any
+    :param trace_memory: see Profiler
+    :return: (hashes of the files except the visualization, Profiler.report() or None,
+        list of (SndpGraph.visualization_data(), file name))
+    '''
+
+    visualizations = []
+    with Profiler(trace_memory) if profile else nullcontext() as profiler:
+        generate_instances(num_locations, num_products, variation, list_num_scen, smps=smps, cache=cache, nested=nested,
+                           reduced_num_scen=reduced_num_scen, visualizations=visualizations)
+        with span('file hashes'):
+            hashes = file_hashes(instance_files(num_locations, num_products, variation, list_num_scen, visualization=False))
+    return hashes, None if profiler is None else profiler.report(), visualizations
+
+
+class BackgroundRenderer():
+    """
+    Renders the visualizations in background threads, so the generation of the next instances continues meanwhile.
+    graphviz renders every visualization in a subprocess, the threads only wait for it.
+    The visualizations are passed as SndpGraph.visualization_data(), not as the graphs.
+
+    Attributes
+    ----------
+    max_workers : int
+        number of the rendering threads
+    max_pending : int
+        submit() waits if that many visualizations are not rendered yet
+
+    Methods
+    -------
+    submit(key, visualization_data, to_file)
+        render_visualization() in the background
+    finished()
+        [(key, failed)] of the keys whose visualizations are all rendered or failed, every key is returned once.
+        failed - any visualization of the key raised an exception
+    join()
+        wait for all the visualizations, returns [(key, exception)] of the failed ones
+    """
+
+    def __init__(self, max_workers = INT_VISUALIZATION_WORKERS, max_pending = INT_MAX_PENDING_VISUALIZATIONS):
+        from concurrent.futures import ThreadPoolExecutor
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sndp_visualization')
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        self._unfinished = {} # key: futures of the key, until finished() returns the key
+
+    def submit(self, key, visualization_data, to_file):
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(render_visualization, visualization_data, to_file=to_file)
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        self._futures.append((key, future))
+        self._unfinished.setdefault(key, []).append(future)
+
+    def finished(self):
+        keys = [key for key, futures in self._unfinished.items() if all(future.done() for future in futures)]
+        return [(key, any(future.exception() is not None for future in self._unfinished.pop(key))) for key in keys]
+
+    def join(self):
+        self._executor.shutdown(wait=True)
+        return [(key, future.exception()) for key, future in self._futures if future.exception() is not None]
+
+
 def generate_command():
 
     '''
@@ -53,6 +316,9 @@ def generate_command():
     result = False
     parsed = parse_args_sndp_gen(sys.argv[1:])
     yaml_filename = parsed.yaml
+    if parsed.jobs < 1:
+        print(f"Error: --jobs should be a positive number, got {parsed.jobs}")
+        return result
 
     parameters = read_parameters(yaml_filename)
     if parameters is None:
@@ -63,6 +329,8 @@ def generate_command():
     list_num_products = parameters.get('num_products')
     list_num_scen = parameters.get('num_scen')
     num_variations = parameters.get('num_variations')
+    nested = bool(parameters.get('nested_scenarios', False))
+    reduced_num_scen = parameters.get('reduced_num_scen')
     if list_num_locations is None:
         print(f"Error: num_locations is not specified in {yaml_filename}")
     elif list_num_products is None:
@@ -71,26 +339,106 @@ def generate_command():
         print(f"Error: num_scen is not specified in {yaml_filename}")
     elif num_variations is None:
         print(f"Error: num_variations is not specified in {yaml_filename}")
+    elif reduced_num_scen is not None and (not isinstance(reduced_num_scen, int) or reduced_num_scen < 1):
+        print(f"Error: reduced_num_scen should be a positive number in {yaml_filename}, got {reduced_num_scen}")
     else:
         # generate all combinations
-        for num_locations in list_num_locations:
-            for num_products in list_num_products:
-                for variation in range(num_variations):
-                    num_scen = list_num_scen[0]  # generate instance for the first num_scen in the list_num_scen
-                    instance_name = 'SNDP_{}_{}_{}_'.format(num_locations, num_products, variation)
-                    graph = SndpGraph(instance_name + str(num_scen), num_locations, num_products, num_scen, random_seed=variation)
-                    graph.adjust_sales_price()
-                    graph.export_mpl(graph.name)
-                    if num_locations <= SndpGraph.INT_MAX_LOCATIONS_TO_VISUALIZE:
-                        graph.visualize(to_file=instance_name)
-                    # We change only stochastic data for this instances.
-                    # We could initilize SNDP_Graph() for every num_scen but since random_seed
-                    # stays the same, the core data will also be the same
-                    for num_scen in list_num_scen[1:]:
-                        graph.regenerate_stochastic_data(num_scen)
-                        graph.export_mpl(instance_name + str(num_scen))
-
-        result = True
+        cells = [(num_locations, num_products, variation, list_num_scen)
+                 for num_locations in list_num_locations
+                 for num_products in list_num_products
+                 for variation in range(num_variations)]
+        failed_cells = []
+        cache = None if parsed.no_cache else SndpCache()
+
+        profiler = None if parsed.profile is None else Profiler(trace_memory=parsed.profile_memory)
+        # the library reports the progress only to the callback, throttled, see sndp_profile.report_progress()
+        with profiler if profiler is not None else nullcontext(), progress_callback(progress_bar):
+            # skip the combinations that are up to date
+            manifest = read_manifest()
+            cell_inputs = {instance_prefix(*cell[:3]): instance_inputs(*cell, smps=parsed.smps, nested=nested,
+                                                                        reduced_num_scen=reduced_num_scen) for cell in cells}
+            if parsed.force:
+                skipped_cells = []
+            else:
+                with span('manifest check'):
+                    skipped_cells = [cell for cell in cells
+                                     if is_up_to_date(manifest.get(instance_prefix(*cell[:3])), cell_inputs[instance_prefix(*cell[:3])])]
+                if skipped_cells:
+                    write_manifest(manifest) # new mtimes of the unchanged files, they are not hashed again
+            cells_to_generate = [cell for cell in cells if cell not in skipped_cells]
+
+            renderer = BackgroundRenderer()
+            visualized_cells = []
+            rendering_entries = {} # instance name: (cell, manifest entry) of the combinations with a visualization being rendered
+
+            def add_rendered_entries():
+                # the entry is added when the visualization is rendered, so the combination is generated again
+                # if the run is interrupted before or the visualization failed
+                for instance_name, failed in renderer.finished():
+                    cell, manifest_entry = rendering_entries.pop(instance_name)
+                    if failed:
+                        continue
+                    manifest_entry['files'].update(file_hashes(visualization_files(*cell[:3])))
+                    manifest[instance_name] = manifest_entry
+
+            def on_cell_done(cell, generate):
+                instance_name = instance_prefix(*cell[:3])
+                manifest.pop(instance_name, None)
+                try:
+                    files, report, visualizations = generate()
+                except Exception as e:
+                    failed_cells.append(cell)
+                    print(f"Error: instances {instance_name} were not generated. Due to this error: {e}")
+                else:
+                    manifest_entry = {'inputs': cell_inputs[instance_name], 'files': files}
+                    if profiler is not None and report is not None:
+                        profiler.merge(report) # phases of the worker process
+                    if visualizations:
+                        rendering_entries[instance_name] = (cell, manifest_entry)
+                    else:
+                        manifest[instance_name] = manifest_entry
+                    for visualization_data, to_file in visualizations:
+                        renderer.submit(instance_name, visualization_data, to_file)
+                        visualized_cells.append(cell)
+                add_rendered_entries()
+                write_manifest(manifest) # after every combination, so the finished ones are skipped if the run is interrupted
+
+            if parsed.jobs > 1:
+                from concurrent.futures import ProcessPoolExecutor
+                with ProcessPoolExecutor(max_workers=parsed.jobs, initializer=set_progress_callback,
+                                         initargs=(progress_bar,)) as executor:
+                    futures = [executor.submit(generate_and_hash_instances, *cell, smps=parsed.smps, cache=cache, nested=nested,
+                                               reduced_num_scen=reduced_num_scen, profile=profiler is not None,
+                                               trace_memory=parsed.profile_memory) for cell in cells_to_generate]
+                    for cell, future in zip(cells_to_generate, futures):
+                        on_cell_done(cell, future.result)
+            else:
+                for cell in cells_to_generate:
+                    on_cell_done(cell, lambda: generate_and_hash_instances(*cell, smps=parsed.smps, cache=cache, nested=nested,
+                                                                                reduced_num_scen=reduced_num_scen))
+
+            with span('visualization join'):
+                failed_visualizations = renderer.join()
+            if rendering_entries:
+                add_rendered_entries()
+                write_manifest(manifest)
+
+        print(f"{len(skipped_cells)} of {len(cells)} combinations are up to date and were skipped")
+        for instance_name, e in failed_visualizations:
+            print(f"WARNING: Visualization of {instance_name} failed. Due to this error: {e}")
+        if failed_visualizations:
+            print(f"WARNING: {len(failed_visualizations)} of {len(visualized_cells)} visualizations failed")
+        profile_written = True
+        if profiler is not None:
+            try:
+                profiler.write(parsed.profile, arguments=sys.argv[1:], jobs=parsed.jobs, num_generated=len(cells_to_generate))
+            except OSError as e:
+                profile_written = False
+                print(f"Error: profile was not written to {parsed.profile}. Due to this error: {e}")
+        if failed_cells:
+            print(f"Error: {len(failed_cells)} of {len(cells)} combinations failed")
+        else:
+            result = profile_written
 
     return result
 
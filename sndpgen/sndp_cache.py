@@ -0,0 +1,172 @@
+import hashlib
+import json
+import mmap
+import os
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+
+
+class SndpCache():
+    """
+    On-disk cache of the core data of SndpGraph, see SndpGraph(cache=...).
+    Every entry is a json header and flat arrays in a file named by the key, the key is a hash of the parameters of the graph.
+    The format is the one of SndpGraph.save() with the magic STR_MAGIC. Nothing is unpickled,
+    a file of the cache folder can be broken but cannot run code.
+    If the total size of the entries exceeds max_size, the least recently used entries are removed.
+
+    Attributes
+    ----------
+    directory : Path
+        folder of the cache files, created on the first store()
+    max_size : int
+        bytes
+    hits, misses : int
+        number of load() calls that found and did not find the entry
+
+    Methods
+    -------
+    key(*params)
+        key of the entry for the parameters, they should have deterministic repr()
+    load(key)
+        (header, arrays) or None if there is no entry
+    store(key, header, arrays)
+        save the json-compatible header and the dict of the arrays, remove the least recently used entries
+    clear()
+        remove all entries
+    """
+
+    STR_DEFAULT_DIRECTORY = '.sndpgen_cache'
+    INT_DEFAULT_MAX_SIZE = 2**30 # bytes
+    STR_SUFFIX = '.core'
+    STR_MAGIC = b'SNDPC001' # first bytes of an entry, the number is the version of the format
+
+    def __init__(self, directory = STR_DEFAULT_DIRECTORY, max_size = INT_DEFAULT_MAX_SIZE):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*params):
+        return hashlib.sha256(repr(params).encode()).hexdigest()
+
+    def load(self, key):
+        file = self._file(key)
+        try:
+            # the entry is read at once, not memory-mapped, so it can be removed by _evict() meanwhile
+            header, arrays = _parse_flat_arrays(file.read_bytes(), SndpCache.STR_MAGIC, file)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except ValueError: # broken entry, e.g., the disk was full, or an entry of an older version
+            file.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        os.utime(file) # mark as recently used
+        self.hits += 1
+        return header, arrays
+
+    def store(self, key, header, arrays):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file and rename, so concurrent processes never read an incomplete entry
+        file_descriptor, temp_name = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(file_descriptor)
+        try:
+            _write_flat_arrays(temp_name, SndpCache.STR_MAGIC, header, arrays)
+            os.replace(temp_name, self._file(key))
+        except BaseException:
+            Path(temp_name).unlink(missing_ok=True)
+            raise
+        self._evict()
+
+    def clear(self):
+        for file in self.directory.glob('*' + SndpCache.STR_SUFFIX):
+            file.unlink(missing_ok=True)
+
+    def _file(self, key):
+        return self.directory / (key + SndpCache.STR_SUFFIX)
+
+    def _evict(self):
+        entries = []
+        for file in self.directory.glob('*' + SndpCache.STR_SUFFIX):
+            try:
+                stat = file.stat()
+            except FileNotFoundError: # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file))
+        total_size = sum(size for _, size, _ in entries)
+        # the oldest first, the newest entry is never removed
+        for _, size, file in sorted(entries)[:-1]:
+            if total_size <= self.max_size:
+                break
+            file.unlink(missing_ok=True)
+            total_size -= size
+
+    def __str__(self):
+        return f'SndpCache: {self.directory}, hits: {self.hits}, misses: {self.misses}'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _write_flat_arrays(path, magic, header, arrays):
+
+    '''Write magic, 8 bytes length of the json header, the header, flat arrays aligned to 8 bytes.
+    The header gets the type code, offset and length of every array, see SndpGraph.save()'''
+
+    entries = {}
+    offset = 0
+    for name, values in arrays.items():
+        entries[name] = (values.typecode, offset, len(values))
+        offset += _aligned(len(values) * values.itemsize)
+    header_bytes = json.dumps(dict(header, byteorder=sys.byteorder, arrays=entries)).encode()
+    header_bytes += b' ' * (-len(header_bytes) % 8)
+    with open(path, 'wb') as file:
+        file.write(magic)
+        file.write(len(header_bytes).to_bytes(8, 'little'))
+        file.write(header_bytes)
+        for values in arrays.values():
+            data = values.tobytes()
+            file.write(data)
+            file.write(bytes(_aligned(len(data)) - len(data)))
+
+
+def _read_flat_arrays(path, magic):
+
+    '''Header and memory-mapped arrays of the file of _write_flat_arrays(), see SndpGraph.read_snapshot()'''
+
+    with open(path, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) # stays valid after the file is closed
+    return _parse_flat_arrays(mapped, magic, path)
+
+
+def _parse_flat_arrays(data, magic, path):
+
+    '''(header, dict of the arrays as memoryview) of the bytes or mmap of the file of _write_flat_arrays().
+    ValueError if the data is not such a file or is truncated'''
+
+    magic_length = len(magic)
+    if data[:magic_length] != magic:
+        raise ValueError(f'{path} is not a SndpGraph snapshot or has another version of the format.')
+    header_length = int.from_bytes(data[magic_length:magic_length + 8], 'little')
+    data_start = magic_length + 8 + header_length
+    header = json.loads(data[magic_length + 8:data_start])
+    view = memoryview(data)
+    arrays = {}
+    for name, (typecode, offset, length) in header.pop('arrays').items():
+        start = data_start + offset
+        end = start + length * array(typecode).itemsize
+        if end > len(view):
+            raise ValueError(f'{path} is truncated.')
+        values = view[start:end].cast(typecode)
+        if header['byteorder'] != sys.byteorder: # the file is from a machine with another byte order
+            values = array(typecode, values)
+            values.byteswap()
+        arrays[name] = values
+    return header, arrays
+
+
+def _aligned(num_bytes):
+    return num_bytes + (-num_bytes % 8)
@@ -0,0 +1,160 @@
+from array import array
+
+INF = float('inf')
+
+
+class SndpExtensiveForm():
+    """
+    Extensive form (deterministic equivalent) of the SNDP instance in SNDP_default.mpl.
+    The constraint matrix is kept in memory in CSR format, no files are written.
+
+    maximize objective @ x
+    subject to row_lower <= A @ x <= row_upper, col_lower <= x <= col_upper, x[j] is integer if integrality[j] == 1
+
+    Columns: the first stage columns (OpenProduction) followed by the second stage columns (Ship) of every scenario.
+    Rows: the second stage rows (BOMConstr, DemConstr, PlantConstr) of every scenario.
+
+    Attributes
+    ----------
+    num_rows, num_cols : int
+        size of the constraint matrix A
+    num_first_stage_cols : int
+        number of the first stage columns, they are the first in x
+    num_scen : int
+        number of scenarios
+    indptr, indices, data : array
+        A in CSR format: entries of row i are data[indptr[i]:indptr[i+1]] in columns indices[indptr[i]:indptr[i+1]]
+    objective, col_lower, col_upper, row_lower, row_upper : array('d')
+        objective coefficients (weighted with the scenario probabilities) and bounds
+    integrality : array('b')
+        1 for the integer columns
+    sales_price : float
+        sales price in the objective
+    revenue_cols : array('l')
+        columns Ship[EndProduct, plantLocation, Market] of all scenarios, their objective includes sales_price
+
+    Methods
+    -------
+    col_name(j), row_name(i)
+        names of the columns and rows, second stage names end with _SCEN<scenario id>
+    set_sales_price(sales_price)
+        change the sales price in the objective
+    to_scipy()
+        constraint matrix as scipy.sparse.csr_matrix. Requires scipy.
+    """
+
+    def __init__(self, core, probabilities, demands):
+
+        '''
+        :param core: dict returned by SndpGraph._core_model()
+        :param probabilities: scenario probabilities
+        :param demands: scenario demands, right-hand side of DemConstr
+        '''
+
+        columns = core['columns']
+        core_rows = core['rows']
+        num_first_stage_cols = core['first_stage_columns']
+        num_core_rows = len(core_rows)
+        num_second_stage_cols = len(columns) - num_first_stage_cols
+        num_scen = len(probabilities)
+        if num_scen != len(demands):
+            raise ValueError('Number of probabilities and demands should be the same.')
+
+        self.num_scen = num_scen
+        self.num_first_stage_cols = num_first_stage_cols
+        self.num_cols = num_first_stage_cols + num_scen * num_second_stage_cols
+        self.num_rows = num_scen * num_core_rows
+        self._core_col_names = [column[0] for column in columns]
+        self._core_row_names = [row[0] for row in core_rows]
+        self._num_core_rows = num_core_rows
+        self._num_second_stage_cols = num_second_stage_cols
+
+        # core matrix row by row
+        core_row_entries = [[] for _ in range(num_core_rows)]
+        for col, (_, _, _, _, entries) in enumerate(columns):
+            for row, coefficient in entries:
+                core_row_entries[row].append((col, coefficient))
+        core_indptr = [0]
+        core_indices = []
+        core_data = []
+        for entries in core_row_entries:
+            core_indices += [col for col, _ in entries]
+            core_data += [float(coefficient) for _, coefficient in entries]
+            core_indptr.append(len(core_indices))
+        core_nnz = len(core_indices)
+
+        # the sparsity pattern of every scenario is the one of the core with shifted second stage columns
+        self.indptr = array('l', [0])
+        self.indices = array('l')
+        self.data = array('d')
+        for scenario in range(num_scen):
+            col_shift = scenario * num_second_stage_cols
+            nnz_shift = scenario * core_nnz
+            self.indptr.extend([pointer + nnz_shift for pointer in core_indptr[1:]])
+            self.indices.extend([col if col < num_first_stage_cols else col + col_shift for col in core_indices])
+            self.data.extend(core_data)
+
+        first_stage = columns[:num_first_stage_cols]
+        second_stage = columns[num_first_stage_cols:]
+        self.objective = array('d', [float(column[1]) for column in first_stage])
+        for probability in probabilities:
+            self.objective.extend([probability * column[1] for column in second_stage])
+        self.col_lower = array('d', bytes(8 * self.num_cols)) # all zeros
+        core_col_upper = [INF if column[2] is None else float(column[2]) for column in columns]
+        self.col_upper = array('d', core_col_upper[:num_first_stage_cols] + core_col_upper[num_first_stage_cols:] * num_scen)
+        core_integrality = [1 if column[3] else 0 for column in columns]
+        self.integrality = array('b', core_integrality[:num_first_stage_cols] + core_integrality[num_first_stage_cols:] * num_scen)
+
+        core_row_lower = [0.0 if sense == 'E' else -INF for _, sense in core_rows]
+        self.row_lower = array('d', core_row_lower * num_scen)
+        self.row_upper = array('d', bytes(8 * self.num_rows)) # all zeros
+        demand_row = core['demand_row']
+        for scenario, demand in enumerate(demands):
+            self.row_upper[scenario * num_core_rows + demand_row] = demand
+
+        self.sales_price = core['sales_price']
+        self.revenue_cols = array('l')
+        self._revenue_weights = array('d')
+        for scenario, probability in enumerate(probabilities):
+            col_shift = num_first_stage_cols + scenario * num_second_stage_cols
+            self.revenue_cols.extend([col - num_first_stage_cols + col_shift for col in core['revenue_columns']])
+            self._revenue_weights.extend([probability] * len(core['revenue_columns']))
+        # objective coefficients of the revenue columns without the sales price
+        self._revenue_base = array('d', [self.objective[col] - weight * self.sales_price
+                                         for col, weight in zip(self.revenue_cols, self._revenue_weights)])
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    def set_sales_price(self, sales_price):
+
+        '''Change the sales price in the objective.
+
+        :return: indices of the changed objective coefficients, i.e., revenue_cols
+        '''
+
+        for col, weight, base in zip(self.revenue_cols, self._revenue_weights, self._revenue_base):
+            self.objective[col] = base + weight * sales_price
+        self.sales_price = sales_price
+        return self.revenue_cols
+
+    def col_name(self, j):
+        if j < self.num_first_stage_cols:
+            return self._core_col_names[j]
+        scenario, col = divmod(j - self.num_first_stage_cols, self._num_second_stage_cols)
+        return f'{self._core_col_names[self.num_first_stage_cols + col]}_SCEN{scenario + 1}'
+
+    def row_name(self, i):
+        scenario, row = divmod(i, self._num_core_rows)
+        return f'{self._core_row_names[row]}_SCEN{scenario + 1}'
+
+    def to_scipy(self):
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.data, self.indices, self.indptr), shape=(self.num_rows, self.num_cols))
+
+    def __str__(self):
+        return f'Extensive form: {self.num_scen} scenarios, {self.num_rows} rows, {self.num_cols} columns, {self.nnz} nonzeros'
+
+    def __repr__(self):
+        return self.__str__()
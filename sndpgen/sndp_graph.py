@@ -1,39 +1,59 @@
 import random
+import threading
 import time
-from graphviz import Digraph
-import multiprocessing as mp
 import math
+from functools import lru_cache
+from itertools import islice
+from bisect import bisect_right
 from warnings import warn
-from pkg_resources import resource_filename
 from pathlib import Path
+import shutil
+import json
+import re
+from array import array
+from sndpgen.sndp_extensive_form import SndpExtensiveForm
+from sndpgen.sndp_cache import SndpCache, _write_flat_arrays, _read_flat_arrays
+from sndpgen.sndp_reduction import reduce_scenarios
+from sndpgen.sndp_profile import Profiler, active_profiler, span, profiled, report_progress
 
 
 class Timer:
-    _timers = {}
+    '''Deprecated, use sndpgen.sndp_profile.Profiler and span() to measure the phases.'''
+
+    _local = threading.local() # every thread has its own timers, so graphs can be generated in parallel threads
+
+    @classmethod
+    def _timers(cls):
+        if not hasattr(cls._local, 'timers'):
+            cls._local.timers = {}
+        return cls._local.timers
 
     @classmethod
     def reset_all(cls):
-        for timer in cls._timers.values():
+        for timer in cls._timers().values():
             timer.reset()
 
     @classmethod
     def report(cls):
         print('Timer: total elapsed time, sec')
-        for timer_label in sorted(cls._timers.keys()):
-            print(cls._timers[timer_label])
+        timers = cls._timers()
+        for timer_label in sorted(timers.keys()):
+            print(timers[timer_label])
 
     def __init__(self, label):
-       if label in self._timers: # we already have such timer
-            current_timer = self._timers[label]
+       warn('Timer is deprecated, use sndpgen.sndp_profile.Profiler and span()', DeprecationWarning, stacklevel=2)
+       timers = self._timers()
+       if label in timers: # we already have such timer
+            current_timer = timers[label]
             self._current_start = current_timer._current_start
             self._previous_elapsed = current_timer._previous_elapsed
             self._label = label
-            self._timers[label] = self
+            timers[label] = self
        else:
             self._current_start = None
             self._previous_elapsed = 0
             self._label = label
-            self._timers[label] = self
+            timers[label] = self
 
 
     @property
@@ -66,35 +86,33 @@ class Timer:
     def __str__(self):
         return self.__repr__()
 
-def progress_bar(task: str, current: int, total: int, barLength = 20):
-    percent = float(current) * 100 / total
-    arrow   = '-' * int(percent/100 * barLength - 1) + '>'
-    spaces  = ' ' * (barLength - len(arrow))
-    bar_str = f'{task}: [{arrow}{spaces}] {current}/{total}'
-    if SndpGraph.DEBUG and (current / 1).is_integer(): # end='r' does not work in PyCharm
-        print(bar_str, end='\n')
-    else:
-        print(bar_str, end='\r')
-
 
 class _Product():
+    __slots__ = ('_graph', 'id', 'type', '_plants', '_plant_set', '_plants_view')
+
     def __init__(self, id, graph):
         self._graph = graph
         self.id = id
         self.type = SndpGraph.STR_PRODUCT_TYPE_MATERIAL
         self._plants = [] # plants where it is being manufactures
+        self._plant_set = set() # the same plants for the membership tests
+        self._plants_view = () # tuple of _plants returned by get_plants(), None after a change
 
         #data cache
         self._graph._data['NrOfProducts'] += 1
 
     def add_plant(self, plant):
-        if plant in self.get_plants():
-            raise ('Plant {} is already in the list of plants of Product {}.'.format(plant.id, self.id))
+        if plant in self._plant_set:
+            raise KeyError('Plant {} is already in the list of plants of Product {}.'.format(plant.id, self.id))
         plant._graph = self._graph
         self._plants.append(plant)
+        self._plant_set.add(plant)
+        self._plants_view = None
 
     def get_plants(self):
-        return self._plants[:]
+        if self._plants_view is None:
+            self._plants_view = tuple(self._plants)
+        return self._plants_view
 
     def __str__(self):
         if self.type == SndpGraph.STR_PRODUCT_TYPE_END_PRODUCT:
@@ -107,46 +125,65 @@ class _Product():
 
 
 class _Location():
+    __slots__ = ('_graph', 'id', '_products', '_product_mask', '_inbounds', '_outbounds',
+                 '_products_view', '_inbounds_view', '_outbounds_view')
+
     def __init__(self, id, graph):
         self._graph = graph
         self.id = id
         self._products = []
+        self._product_mask = 0 # bit product.id is set for every product of the location
         self._inbounds = [] # inbound routes
         self._outbounds = []  # outbound routes
+        # tuples returned by get_products(), get_inbounds(), get_outbounds(), None after a change
+        self._products_view = ()
+        self._inbounds_view = ()
+        self._outbounds_view = ()
 
         # data cache
         self._graph._data['NrOfLocations'] += 1
 
     def add_product(self, product):
-        if product in self.get_products():
-            raise(f'Product {product} is already produced in location {self.id}')
+        if self._product_mask >> product.id & 1:
+            raise KeyError(f'Product {product} is already produced in location {self.id}')
         assert(product._graph == self._graph)
         self._products.append(product)
+        self._products_view = None
+        self._product_mask |= 1 << product.id
         product.add_plant(self)
         if product.type == SndpGraph.STR_PRODUCT_TYPE_END_PRODUCT:
-            self._graph._end_product_plants.add(self)
+            self._graph._end_product_plants[self] = None
+        self._graph._product_log.extend((self.id, product.id))
 
         # data cache
-        for name in ['ScalarData', 'ShipCost', 'ArcProduct', 'arc']: # 'MaterialReq' are excluded since they cannot be modified:
+        for name in ['ScalarData', 'ShipCost', 'ArcProduct', 'arc', 'SMPS']: # 'MaterialReq' are excluded since they cannot be modified:
             self._graph._data_valid_export[name] = None
         self.update_graph_data_cache(product)
 
     def get_products(self):
-        return self._products[:]
+        if self._products_view is None:
+            self._products_view = tuple(self._products)
+        return self._products_view
 
     def add_inbound(self, route):
         route._graph = self._graph
         self._inbounds.append(route)
+        self._inbounds_view = None
 
     def get_inbounds(self):
-        return self._inbounds[:]
+        if self._inbounds_view is None:
+            self._inbounds_view = tuple(self._inbounds)
+        return self._inbounds_view
 
     def add_outbound(self, route):
         route._graph = self._graph
         self._outbounds.append(route)
+        self._outbounds_view = None
 
     def get_outbounds(self):
-        return self._outbounds[:]
+        if self._outbounds_view is None:
+            self._outbounds_view = tuple(self._outbounds)
+        return self._outbounds_view
 
     def update_graph_data_cache(self, product = None, route = None):
         if product is None:
@@ -157,28 +194,29 @@ class _Location():
             routes = self.get_outbounds()
         else:
             routes = [route]
+        graph = self._graph
+        end_location = graph.get_end_location()
+        # keys are the (product, start, finish) and (start, finish) tuples of ids
+        arc_products = graph._data['ArcProduct']
+        arcs = graph._data['arc']
         for product in products:
-            end_location = self._graph.get_end_location()
+            is_material = product.type == SndpGraph.STR_PRODUCT_TYPE_MATERIAL
             for route in routes:
-                if product.type == SndpGraph.STR_PRODUCT_TYPE_MATERIAL and route.end == end_location:
+                if is_material and route.end is end_location:
                     continue
-                new_arc_prod_key = f'{product.id},{route.start.id},{route.end.id}'
-                if new_arc_prod_key not in self._graph._data['ArcProduct']:
-                    self._graph._data['ArcProduct'][new_arc_prod_key] = {'product': product.id, 'start': route.start.id, 'finish': route.end.id, 'value': 1}
-                    self._graph._data_txt['ArcProduct'] += f'{new_arc_prod_key},1\n'
-                    new_arc_key = f'{route.start.id},{route.end.id}'
-                    if new_arc_key not in self._graph._data['arc']:
-                        self._graph._data['arc'][new_arc_key] = {'start': route.start.id, 'finish': route.end.id}
-                        self._graph._data_txt['arc'] += f'{new_arc_key}\n'
-            if product.type == SndpGraph.STR_PRODUCT_TYPE_MATERIAL and self in self._graph.get_end_product_plants():
-                new_arc_prod_key = f'{product.id},{self.id},{self.id}'
-                if new_arc_prod_key not in self._graph._data['ArcProduct']:
-                    self._graph._data['ArcProduct'][new_arc_prod_key] = {'product': product.id, 'start': self.id, 'finish': self.id, 'value': 1}
-                    self._graph._data_txt['ArcProduct'] += f'{new_arc_prod_key},1\n'
-                    new_arc_key = f'{self.id},{self.id}'
-                    if new_arc_key not in self._graph._data['arc']:
-                        self._graph._data['arc'][new_arc_key] = {'start': self.id, 'finish': self.id}
-                        self._graph._data_txt['arc'] += f'{self.id},{self.id}\n'
+                new_arc_key = (route.start.id, route.end.id)
+                new_arc_prod_key = (product.id,) + new_arc_key
+                if new_arc_prod_key not in arc_products:
+                    graph._add_data_row('ArcProduct', new_arc_prod_key, new_arc_prod_key + (1,))
+                    if new_arc_key not in arcs:
+                        graph._add_data_row('arc', new_arc_key, new_arc_key)
+            if is_material and self in graph._end_product_plants:
+                new_arc_key = (self.id, self.id)
+                new_arc_prod_key = (product.id,) + new_arc_key
+                if new_arc_prod_key not in arc_products:
+                    graph._add_data_row('ArcProduct', new_arc_prod_key, new_arc_prod_key + (1,))
+                    if new_arc_key not in arcs:
+                        graph._add_data_row('arc', new_arc_key, new_arc_key)
 
     def __str__(self):
         if self.get_products():
@@ -191,11 +229,13 @@ class _Location():
 
 
 class _Route():
+    __slots__ = ('_graph', 'start', 'end', 'distance')
+
     def __init__(self, start, end, distance):
         if not isinstance(start, _Location) or not isinstance(end, _Location):
-            raise('Start and end should be Location objects.')
+            raise TypeError('Start and end should be Location objects.')
         if start.id == end.id:
-            raise('Start and end are the same location for the route.')
+            raise ValueError('Start and end are the same location for the route.')
         self._graph = None
         self.start = start
         start.add_outbound(self)
@@ -211,6 +251,8 @@ class _Route():
 
 
 class _Scenario():
+    __slots__ = ('_graph', 'id', 'probability', 'demand')
+
     def __init__(self, id, probability, demand):
         self._graph = None
         self.id = id
@@ -224,6 +266,49 @@ class _Scenario():
         return self.__str__()
 
 
+class _ScenarioData():
+    """
+    Prob or Demand data cache of the scenarios 1..n: one array of values instead of a dict of rows.
+    Supports the part of the dict interface used for the other data items in SndpGraph._data,
+    the rows are (scenario id, value). New rows are added only in the order of the scenario ids.
+    """
+    __slots__ = ('values_array',)
+
+    def __init__(self, values = None):
+        self.values_array = [] if values is None else values
+
+    def __len__(self):
+        return len(self.values_array)
+
+    def __contains__(self, scenario_id):
+        return isinstance(scenario_id, int) and 1 <= scenario_id <= len(self.values_array)
+
+    def __getitem__(self, scenario_id):
+        if scenario_id not in self:
+            raise KeyError(scenario_id)
+        return scenario_id, self.values_array[scenario_id - 1]
+
+    def __setitem__(self, scenario_id, row):
+        if scenario_id != len(self.values_array) + 1:
+            raise KeyError(f'Scenario {scenario_id} should be added after scenario {len(self.values_array)}.')
+        try:
+            self.values_array.append(row[1])
+        except TypeError: # e.g., float value in array('q')
+            self.values_array = list(self.values_array) + [row[1]]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return range(1, len(self.values_array) + 1)
+
+    def values(self):
+        return zip(self.keys(), self.values_array)
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+
 class SndpGraph():
     # Be careful with these parameters
     FLOAT_PERCENT_OF_LOC_WITH_END_PROD = 0.5 # this amount*num locations will be number bins in the problem
@@ -240,168 +325,388 @@ class SndpGraph():
     STR_PRODUCT_TYPE_MATERIAL = 'STR_PRODUCT_TYPE_MATERIAL'
     STR_PRODUCT_TYPE_END_PRODUCT = 'STR_PRODUCT_TYPE_END_PRODUCT'
 
+    # demands of regenerate_stochastic_data()
+    STR_DEMAND_UNIQUE = 'unique' # different integer demands, num_scen is limited by the demand range
+    STR_DEMAND_REPEATED = 'repeated' # integer demands, might repeat
+    STR_DEMAND_FLOAT = 'float' # non-integer demands
+
     INT_MIN_MULTITHREAD_LOCATION_LIMIT = 2000 # we force num_cpu to be 1 if number_locations lower this value
     INT_MAX_LOCATIONS_TO_VISUALIZE = 40 # we will not run visualize() if the number of locations exceeds this value
+    INT_EXPORT_CHUNK_ROWS = 10000 # rows of .dat file formatted and written at once by the streaming export
+    INT_EXPORT_BUFFER_SIZE = 2**20 # bytes, buffer of the .dat files written by the streaming export
+    INT_CORE_DATA_VERSION = 2 # part of the SndpCache key, increase if the core data generation changes
+    STR_SNAPSHOT_MAGIC = b'SNDPG001' # first bytes of the save() file, the number is the version of the format
     DEBUG = False
 
+    # columns of the array data, rows in self._data are stored as tuples of these values
+    _DATA_HEADERS = {'MaterialReq': ('material', 'value'),
+                     'Prob': ('SCEN', 'value'),
+                     'Demand': ('SCEN', 'value'),
+                     'ShipCost': ('start', 'finish', 'value'),
+                     'ArcProduct': ('product', 'start', 'finish', 'value'),
+                     'arc': ('start', 'finish')}
 
-    def __init__(self, name, num_locations, num_products, num_scen, random_seed = None):
 
-        Timer('Core data generated').start()
+    def __init__(self, name, num_locations, num_products, num_scen, random_seed = None, num_cpu = 1, compact = False, cache = None):
+
+        with span('core data'):
+            self._init_graph(name, num_locations, num_products, random_seed, compact)
+
+            if num_locations < SndpGraph.INT_MIN_MULTITHREAD_LOCATION_LIMIT:
+                num_cpu = 1 # multiprocessing does not provide any efficiency improvements for small graphs
+
+            # Core data: material requirements, routes and products of the locations
+            cache_key = None
+            if cache is not None and random_seed is not None: # without the seed the data is not reproducible
+                cache_key = SndpGraph._core_cache_key(num_locations, num_products, random_seed)
+            entry = None if cache_key is None else cache.load(cache_key)
+            if entry is not None:
+                header, arrays = entry
+                with span('cache load'): # a Profiler reports the cache hits as the calls of this span
+                    self._load_core_snapshot(dict(arrays, random_state=_random_state(header['random_state'])))
+            else:
+                self._generate_core_data(num_locations, num_products, num_cpu)
+                if cache_key is not None:
+                    arrays = self._core_snapshot()
+                    cache.store(cache_key, {'random_state': arrays.pop('random_state')}, arrays)
+
+        assert (self._data['NrOfLocations'] == num_locations)
+        assert (self._data['NrOfLocations'] == len(self.get_locations()))
+        assert (self._data['NrOfProducts'] == num_products)
+        assert (self._data['NrOfProducts'] == len(self.get_products()))
+
+        # Stochastic data
+        self.regenerate_stochastic_data(num_scen)
+
+    def _init_graph(self, name, num_locations, num_products, random_seed, compact):
+
+        '''Empty data cache, products and locations without routes. Called from __init__() and load().'''
 
         self.name = name
+        self._product_log = array('i') # flat log of add_product() calls: location id, product id, see _core_snapshot()
         self.dot_graph = None
         self.random_seed = random_seed
-        random.seed(random_seed)
+        # every graph draws from its own random generator, the global random module is not used:
+        # graphs generated in parallel threads or interleaved calls of different graphs do not change each other's data
+        self._rng = random.Random(random_seed)
 
         # Initialize data cache
         self._data = {}
+        self._data_valid_export = {'ScalarData': None, 'SMPS': None}  # path to the .dat (.cor for SMPS) file that is actual for current data
+        self._data_partial_export = {}  # (path to the .dat file, number of its rows) whose rows are the first rows of the current data
         self.sales_price = SndpGraph.FLOAT_INIT_SALES_PRICE
         self._data['PlantCost'] = SndpGraph.FLOAT_PLANT_COST
         self._data['PlantCapacity'] = SndpGraph.FLOAT_PLANT_CAPACITY
         self._data['NrOfLocations'] = 0
         self._data['NrOfProducts'] = 0
-        self._data_valid_export = {'ScalarData': None}  # path to the .dat file that is actual for current data
 
         list_data_names = ['MaterialReq','Prob','Demand','ShipCost','ArcProduct','arc']
-        self._data_txt = {} # textual representation for .dat files
+        # textual representation for .dat files: list of chunks, joined once in export_mpl()
+        # compact graph does not keep it and formats the rows of self._data on export
+        self._data_txt = None if compact else {}
         for name in list_data_names:
-            self._data[name] = {}
-            self._data_txt[name] = ''
+            self._data[name] = _ScenarioData() if name in ['Prob', 'Demand'] else {}
+            if self._data_txt is not None:
+                self._data_txt[name] = []
             self._data_valid_export[name] = None
 
         # Initialize products
         if num_products < 2:
-            raise('There should be at least two products in the SNDP problem: material and end product.')
+            raise ValueError('There should be at least two products in the SNDP problem: material and end product.')
         if num_products > 40:
             print(f'If num products > 40, the instance might be disbalanced: production too expensive and solution value 0')
         self._products = {product_id:_Product(product_id, self) for product_id in range(1, num_products + 1)}  # +1 since in MPL indexing starts from 1
-        self.get_products()[-1].type = SndpGraph.STR_PRODUCT_TYPE_END_PRODUCT # last product is end product
-        max_material_req = math.floor(40/(num_products)*2) # in order to have moderate production costs
-        self.material_requirements = [random.randint(1, max_material_req) for material in self.get_materials()] # in the end product
-        self._data['MaterialReq'] = {i: {'material': i + 1, 'value': k} for (i, k) in enumerate(self.material_requirements)}
-        self._data_txt['MaterialReq'] += '\n'.join([f'{i + 1},{k}' for (i, k) in enumerate(self.material_requirements)])
+        # products and locations do not change after the initialization, their accessors return these tuples
+        self._products_view = tuple(self._products.values())
+        self._materials_view = self._products_view[:-1] # all except the last products which are the end product
+        self.get_end_product().type = SndpGraph.STR_PRODUCT_TYPE_END_PRODUCT # last product is end product
 
         # Initialize all locations
         if num_locations < 2:
-            raise('There should be at least two locations in the SNDP problem: market and another location.')
+            raise ValueError('There should be at least two locations in the SNDP problem: market and another location.')
         self._locations = {location_id:_Location(location_id, self) for location_id in range(1, num_locations + 1)}
+        self._locations_view = tuple(self._locations.values())
+        self._plants_view = self._locations_view[:-1] # last location is end location
+        self._routes = {} # (start id, end id): route
+        self._routes_view = () # tuple returned by get_routes(), None after a change
+        self._scenarios_view = None # (Prob data, number of scenarios, tuple returned by get_scenarios())
+        self._end_product_plants = {} # insertion ordered: iteration order of a set of objects differs between processes
+
+    def _generate_core_data(self, num_locations, num_products, num_cpu):
+
+        '''Generate material requirements, routes and products of the locations. Called from __init__().'''
+
+        rng = self._rng
+
+        max_material_req = math.floor(40/(num_products)*2) # in order to have moderate production costs
+        self.material_requirements = [rng.randint(1, max_material_req) for material in self.get_materials()] # in the end product
+        for (i, k) in enumerate(self.material_requirements):
+            self._add_data_row('MaterialReq', i, (i + 1, k))
 
         # Nodes with end product
-        self._routes = {}
-        plants_for_end_products = random_subset(self.get_plants(), math.floor(num_locations * SndpGraph.FLOAT_PERCENT_OF_LOC_WITH_END_PROD)) # set it right away for efficiency
-        self._end_product_plants = set()
+        plants_for_end_products = random_subset(self.get_plants(), math.floor(num_locations * SndpGraph.FLOAT_PERCENT_OF_LOC_WITH_END_PROD), rng) # set it right away for efficiency
         for plant in plants_for_end_products:
             # end product (at least) should be produced there
-            route_object = _Route(plant, self.get_end_location(), random.randint(1, SndpGraph.INT_MAX_DISTANCE))
+            route_object = _Route(plant, self.get_end_location(), rng.randint(1, SndpGraph.INT_MAX_DISTANCE))
             self.add_route(route_object)
             plant.add_product(self.get_end_product())
         end_product_plants = self.get_end_product_plants()
 
         # Assign materials to plants and create routes
-        #num_cpu = mp.cpu_count()
-        num_cpu = 1 # multiprocessing does not provide any efficiency improvements
-        if num_locations < SndpGraph.INT_MIN_MULTITHREAD_LOCATION_LIMIT:
-            num_cpu = 1
-
-        if num_cpu > 1: # multiprocessing
-            raise NotImplementedError('We need to fill in data cache here in the same manner as for single thread case.')
-            add_products = [] # will store the changes to be applied
-            manager = mp.Manager()
-            # normal dict will not be shared among processes but we need it to be shared
-            # manager.dict() makes things much slower - maybe use Array.
-            add_routes = manager.dict()
-            # add_routes = {} # even if we use normal dict (makes no sense) there is no benefit in speed
-            pool = mp.Pool(num_cpu)
-            results = [pool.apply_async(self.generate_plant_data, args=(worker_id, add_routes, num_cpu)) for worker_id in range(num_cpu)]
-            pool.close()
-            pool.join()
-            for result in [res.get() for res in results]:
-                add_products += result
+        with span('plants'):
+            # Every plant draws from its own random stream derived from base_seed and plant id.
+            # Thus, the generated data does not depend on num_cpu and on how plants are split among the workers.
+            base_seed = rng.getrandbits(64)
+            plant_ids = [plant.id for plant in self.get_plants()]
+            end_product_plant_ids = [plant.id for plant in end_product_plants]
+            material_ids = [material.id for material in self.get_materials()]
+            plants_per_worker = math.ceil(len(plant_ids) / num_cpu)
+            args = [(base_seed, plant_ids[plants_start:plants_start + plants_per_worker], end_product_plant_ids, material_ids,
+                     SndpGraph.INT_MAX_PRODUCTS_IN_ONE_LOCATION, SndpGraph.INT_MAX_DISTANCE)
+                    for plants_start in range(0, len(plant_ids), plants_per_worker)]
+            if num_cpu > 1: # multiprocessing
+                import multiprocessing as mp # only the large graphs are generated in parallel
+                profiler = active_profiler()
+                with mp.Pool(num_cpu) as pool:
+                    if profiler is None:
+                        results = pool.starmap(generate_plant_data, args)
+                    else:
+                        results = []
+                        for plant_data, report in pool.starmap(_profiled_generate_plant_data,
+                                                               [(profiler.trace_memory,) + worker_args for worker_args in args]):
+                            results.append(plant_data)
+                            profiler.merge(report)
+            else:
+                with span('worker'):
+                    results = [generate_plant_data(*worker_args) for worker_args in args]
 
             # apply changes
-            # since data is not shared among processes, .add_product() and .add_route() should not be called from generate_plant_data()
-            for record in add_products:
-                plant = self.get_location(record['plant'])
-                material = self.get_product(record['material'])
-                plant.add_product(material)
-            for key, distance in add_routes.items():
-                star_id = int(key.split('-')[0])
-                start_location = self.get_location(star_id)
-                end_id = int(key.split('-')[1])
-                end_location = self.get_location(end_id)
-                self.add_route(_Route(start_location, end_location, distance))
-        else:
-            # we do not use here generate_plant_data() because making .add_route() and .add_product() right away is much faster
-            num_plants = len(self.get_plants())
-            for plant in self.get_plants():
-                if plant in end_product_plants:
-                    min_materials = 0  # in potential plants none of the materials might be manufactured
-                    max_materials = math.ceil(len(self.get_materials())/4) # to avoid that all materials are manufactured on the plant site and should not be delivered
-                else:
-                    min_materials = 1
-                    max_materials = len(self.get_materials())
-                random_num_materials = min(random.randint(min_materials, max_materials),
-                                           SndpGraph.INT_MAX_PRODUCTS_IN_ONE_LOCATION)
-                if random_num_materials == 0: # no materials produced, lets go to the next plant
-                    continue
-
-                # Define the route to (several or all) potential end product plants for every plant
-                random_num_end_product_plants = random.randint(1, len(end_product_plants))
-                random_end_product_plants = random_subset(end_product_plants, random_num_end_product_plants)
-                # connect the location with the end product plants
-                for end_product_plant in random_end_product_plants:
-                    # we need route only if product is produced not in the potential plant locations
-                    if plant.id == end_product_plant.id:
-                        continue
-                    # routes can be one directional, omit the route if it already exists in another direction
-                    if self.get_route(end_product_plant, plant):
-                        continue
-                    if not self.get_route(plant, end_product_plant):  # if the route does not already exist
-                        self.add_route(_Route(plant, end_product_plant, random.randint(1, SndpGraph.INT_MAX_DISTANCE)))
-
-                # Define materials to produce
-                random_materials = random_subset(self.get_materials(), random_num_materials)  # except the last one
-                for material in random_materials:
-                    plant.add_product(material)
-
-                progress_bar('Generate data for plants', plant.id, num_plants)
+            # since data is not shared among processes, .add_product() and .add_route() are called here,
+            # plant by plant in the order of the plant ids, so the data cache is filled in the same manner for any num_cpu
+            num_plants = len(plant_ids)
+            for plant_data in results:
+                for plant_id, plant_material_ids, plant_routes in plant_data:
+                    plant = self.get_location(plant_id)
+                    for end_product_plant_id, distance in plant_routes:
+                        end_product_plant = self.get_location(end_product_plant_id)
+                        # routes can be one directional, omit the route if it already exists in another direction
+                        if self.get_route(end_product_plant, plant) or self.get_route(plant, end_product_plant):
+                            continue
+                        self.add_route(_Route(plant, end_product_plant, distance))
+                    for material_id in plant_material_ids:
+                        plant.add_product(self.get_product(material_id))
+
+                    report_progress('Generate data for plants', plant.id, num_plants)
 
         # Test if graph is valid and solve the issues
         # - check if plant with material has at least one route to potential plant: this is guaranteed during assignment of materials to plants
         # - check if every potential plant has all the materials delivered
         # it will also automatically solve the issue if a material has no plant, since such material will not be delivered to all plants
-        for counter, end_product_plant in enumerate(end_product_plants, 1):
-            # materials produced in the plant itself
-            available_materials = [product for product in end_product_plant.get_products() if
-                                   product.type == SndpGraph.STR_PRODUCT_TYPE_MATERIAL]
-            # and materials delivered
-            connected_plants = [route.start for route in end_product_plant.get_inbounds()]
-            for connected_plant in connected_plants:
-                available_materials += [product for product in connected_plant.get_products() if product.type == SndpGraph.STR_PRODUCT_TYPE_MATERIAL]
-            materials_not_delivered_to_plant = [material for material in self.get_materials() if
-                                                material not in available_materials]
-            for material in materials_not_delivered_to_plant:
-                # add material to the potential plant itself or connected plants
-                if len(connected_plants) > 0:
-                    random_plant = random_subset(connected_plants, 1)[0]
-                else: # produce in plant itself if no plants are connected
-                    random_plant = end_product_plant
-                random_plant.add_product(material)
-
-            progress_bar('Validate data for plants', counter, len(end_product_plants))
-
-        str(Timer('Core data generated'))
-        Timer('Core data generated').reset()
+        with span('validation'):
+            materials = self.get_materials()
+            materials_mask = sum(1 << material.id for material in materials)
+            for counter, end_product_plant in enumerate(end_product_plants, 1):
+                # materials produced in the plant itself and materials delivered: union of the product bitsets
+                available_mask = end_product_plant._product_mask
+                connected_plants = [route.start for route in end_product_plant.get_inbounds()]
+                for connected_plant in connected_plants:
+                    available_mask |= connected_plant._product_mask
+                if available_mask & materials_mask == materials_mask: # all materials are covered
+                    materials_not_delivered_to_plant = []
+                else:
+                    materials_not_delivered_to_plant = [material for material in materials if not available_mask >> material.id & 1]
+                for material in materials_not_delivered_to_plant:
+                    # add material to the potential plant itself or connected plants
+                    if len(connected_plants) > 0:
+                        random_plant = random_subset(connected_plants, 1, rng)[0]
+                    else: # produce in plant itself if no plants are connected
+                        random_plant = end_product_plant
+                    random_plant.add_product(material)
+
+                report_progress('Validate data for plants', counter, len(end_product_plants))
+
+    @staticmethod
+    def _core_cache_key(num_locations, num_products, random_seed):
+        # everything that changes the core data, INT_CORE_DATA_VERSION should be increased if the generation algorithm changes
+        return SndpCache.key(SndpGraph.INT_CORE_DATA_VERSION, num_locations, num_products, random_seed,
+                             SndpGraph.FLOAT_PERCENT_OF_LOC_WITH_END_PROD, SndpGraph.INT_MAX_PRODUCTS_IN_ONE_LOCATION,
+                             SndpGraph.INT_MAX_DISTANCE)
+
+    def _core_snapshot(self):
+
+        '''Core data for SndpCache as flat int arrays: material requirements, routes (start, end, distance),
+        the log of add_product() calls (location, product), the rows of ArcProduct (product, start, finish) and arc (start, finish),
+        and the state of the random generator after the generation.'''
+
+        routes = array('i')
+        for route in self._routes.values():
+            routes.extend((route.start.id, route.end.id, route.distance))
+        arc_products = array('i')
+        for product_id, start_id, finish_id, _ in self._data['ArcProduct'].values():
+            arc_products.extend((product_id, start_id, finish_id))
+        arcs = array('i')
+        for row in self._data['arc'].values():
+            arcs.extend(row)
+        return {'material_requirements': array('i', self.material_requirements),
+                'routes': routes,
+                'products': self._product_log,
+                'arc_products': arc_products,
+                'arcs': arcs,
+                'random_state': self._rng.getstate()}
+
+    def _load_core_snapshot(self, snapshot):
+
+        '''Restore the core data of _core_snapshot(). The objects are linked directly and the data cache is filled
+        in the original order, without add_route() and add_product(), so the exported files are the same.
+        The random state is restored if the snapshot has it.'''
+
+        self.material_requirements = list(snapshot['material_requirements'])
+        for (i, k) in enumerate(self.material_requirements):
+            self._add_data_row('MaterialReq', i, (i + 1, k))
+
+        locations = self._locations
+        routes = snapshot['routes']
+        ship_costs = self._data['ShipCost']
+        for row in _rows(routes, 3):
+            start_id, end_id, distance = row
+            route = _Route(locations[start_id], locations[end_id], distance)
+            route._graph = self
+            self._routes[start_id, end_id] = route
+            ship_costs[start_id, end_id] = row
+        self._routes_view = None
+
+        products = self._products
+        end_product = self.get_end_product()
+        self._product_log = array('i', snapshot['products'])
+        for location_id, product_id in _rows(self._product_log, 2):
+            location = locations[location_id]
+            product = products[product_id]
+            location._products.append(product)
+            location._products_view = None
+            location._product_mask |= 1 << product_id
+            product._plants.append(location)
+            product._plant_set.add(location)
+            product._plants_view = None
+            if product is end_product:
+                self._end_product_plants[location] = None
+
+        arc_products = snapshot['arc_products']
+        self._data['ArcProduct'].update((row, row + (1,)) for row in _rows(arc_products, 3))
+        arcs = snapshot['arcs']
+        self._data['arc'].update((row, row) for row in _rows(arcs, 2))
+
+        if self._data_txt is not None:
+            # the rows are formatted at once, the same text as _format_data_row() of every row
+            self._data_txt['ShipCost'] = ['%d,%d,%d\n' * (len(routes) // 3) % tuple(routes)]
+            self._data_txt['ArcProduct'] = ['%d,%d,%d,1\n' * (len(arc_products) // 3) % tuple(arc_products)]
+            self._data_txt['arc'] = ['%d,%d\n' * (len(arcs) // 2) % tuple(arcs)]
+        if 'random_state' in snapshot:
+            self._rng.setstate(snapshot['random_state'])
+
+    @profiled('save')
+    def save(self, path):
+
+        '''Save the graph to the binary snapshot file, see load().
+        File: 8 bytes STR_SNAPSHOT_MAGIC, 8 bytes length of the json header, the header, flat arrays aligned to 8 bytes.
+        The header has the scalar data and the type code, offset and length of every array, so the arrays can be memory-mapped.
+
+        Arrays: material_requirements, routes (start, end, distance), products (location, product in the order of add_product()),
+        arc_products (product, start, finish), arcs (start, finish), scenario_ids, probabilities, demands.
+
+        :param path: file path
+        '''
+
+        arrays = self._core_snapshot()
+        random_state = arrays.pop('random_state')
+        arrays['scenario_ids'] = array('i', self._data['Prob'].keys())
+        arrays['probabilities'] = array('d', self._data['Prob'].values_array)
+        demands = self._data['Demand'].values_array
+        arrays['demands'] = array('q' if all(isinstance(demand, int) for demand in demands) else 'd', demands)
+        header = {'name': self.name, 'num_locations': len(self._locations), 'num_products': len(self._products),
+                  'random_seed': self.random_seed, 'sales_price': self.sales_price, 'random_state': random_state}
+        _write_flat_arrays(path, SndpGraph.STR_SNAPSHOT_MAGIC, header, arrays)
 
-        assert (self._data['NrOfLocations'] == num_locations)
-        assert (self._data['NrOfLocations'] == len(self.get_locations()))
-        assert (self._data['NrOfProducts'] == num_products)
-        assert (self._data['NrOfProducts'] == len(self.get_products()))
+    @classmethod
+    @profiled('load')
+    def load(cls, path, compact = False):
 
-        # Stochastic data
-        self._scenarios = []
-        self.regenerate_stochastic_data(num_scen)
+        '''Graph saved with save(). The core data is not generated, the random state is restored,
+        so regenerate_stochastic_data() continues as in the saved graph.
+
+        :param path: file path
+        :param compact: see __init__()
+        :return: SndpGraph
+        '''
+
+        header, arrays = SndpGraph.read_snapshot(path)
+        graph = cls.__new__(cls)
+        graph._init_graph(header['name'], header['num_locations'], header['num_products'], header['random_seed'], compact)
+        graph.sales_price = header['sales_price']
+        graph._load_core_snapshot(dict(arrays, random_state=_random_state(header['random_state'])))
+        graph._set_stochastic_data(array('d', arrays['probabilities']), array(arrays['demands'].format, arrays['demands']))
+        return graph
+
+    @staticmethod
+    def read_snapshot(path):
+
+        '''Memory-mapped arrays of the file written by save(), without building the graph.
+        Only the pages of the arrays that are read are loaded from the disk.
+
+        :param path: file path
+        :return: (header dict, dict of the arrays as memoryview)
+        '''
+
+        return _read_flat_arrays(path, SndpGraph.STR_SNAPSHOT_MAGIC)
+
+    @classmethod
+    @profiled('from_dat')
+    def from_dat(cls, prefix, compact = False):
+
+        '''Graph of the instance prefix.mpl, e.g., from_dat('tests/10_5_0_1').
+        The .dat files are the ones referenced in prefix.mpl (export_mpl() reuses the files that did not change),
+        or prefix_<data item>.dat if there is no .mpl file.
+        Every file is parsed at once, the data cache is filled in the order of the rows in the files,
+        so export_mpl() writes the same files (every row ends with a newline).
+        The locations produce the products that they ship according to ArcProduct.dat.
+        The random seed is unknown, the random generator of the graph is seeded from the system like SndpGraph(random_seed=None).
+
+        :param prefix: path to the instance without .mpl
+        :param compact: see __init__()
+        :return: SndpGraph
+        '''
+
+        prefix = str(prefix)
+        data_files = _mpl_data_files(prefix)
+        scalar_data = _read_scalar_dat(data_files['ScalarData'])
+        num_products = scalar_data['NrOfProducts']
+        graph = cls.__new__(cls)
+        graph._init_graph(Path(prefix).name, scalar_data['NrOfLocations'], num_products, None, compact)
+        graph.sales_price = scalar_data['SalesPrice']
+        graph._data['PlantCost'] = scalar_data['PlantCost']
+        graph._data['PlantCapacity'] = scalar_data['PlantCapacity']
+
+        values = {name: _read_array_dat(data_files[name], name)
+                  for name in ['MaterialReq', 'ShipCost', 'ArcProduct', 'arc', 'Prob', 'Demand']}
+        material_req = values['MaterialReq']
+        if material_req[0::2] != list(range(1, num_products)):
+            raise ValueError(f'{data_files["MaterialReq"]} should have the requirements of materials 1..{num_products - 1}.')
+        arc_product = values['ArcProduct']
+        if any(value != 1 for value in arc_product[3::4]):
+            raise ValueError(f'Values in {data_files["ArcProduct"]} should be 1.')
+        products, starts, finishes = arc_product[0::4], arc_product[1::4], arc_product[2::4]
+        location_products = dict.fromkeys(zip(starts, products)) # in the order of the first shipment
+        graph._load_core_snapshot({'material_requirements': material_req[1::2],
+                                   'routes': values['ShipCost'],
+                                   'products': array('i', [value for pair in location_products for value in pair]),
+                                   'arc_products': array('i', [value for row in zip(products, starts, finishes) for value in row]),
+                                   'arcs': values['arc']})
+
+        probabilities, demands = values['Prob'], values['Demand']
+        scenario_ids = list(range(1, scalar_data['NrOfScen'] + 1))
+        if probabilities[0::2] != scenario_ids or demands[0::2] != scenario_ids:
+            raise ValueError(f'{data_files["Prob"]} and {data_files["Demand"]} should have the scenarios 1..NrOfScen.')
+        graph._set_stochastic_data(probabilities[1::2], demands[1::2])
+        return graph
 
     @property
     def sales_price(self):
@@ -410,6 +715,7 @@ class SndpGraph():
     @sales_price.setter
     def sales_price(self, value):
         self._data['SalesPrice'] = value
+        self._data_valid_export['SMPS'] = None # sales price is in the objective of the core file
 
     @property
     def data_as_dict(self):
@@ -419,104 +725,129 @@ class SndpGraph():
             result[name] = self._data[name]
         # array data
         for name in ['MaterialReq', 'Prob', 'Demand', 'ShipCost', 'ArcProduct', 'arc']:  # 'MaterialReq' are excluded since they cannot be modified:
-            result[name] = list(self._data[name].values())
+            headers = SndpGraph._DATA_HEADERS[name]
+            result[name] = [dict(zip(headers, row)) for row in self._data[name].values()]
 
         return result
 
-    def generate_plant_data(self, worker_id, shared_add_routes, num_cpu = 0):
-        '''Used in multiprocessing. Generates most of the data except the stochastic data'''
-        random.seed(self.random_seed * worker_id+1) # +1 to avoid 0
-        if num_cpu == 0:
-            num_cpu = mp.cpu_count()
+    def regenerate_stochastic_data(self, num_scen, demand_type = STR_DEMAND_UNIQUE):
 
-        add_products = [] # result that we will return
-        all_plants = self.get_plants()
-        end_product_plants = self.get_end_product_plants()
+        '''Draw the demands and the probabilities of num_scen new scenarios. All demands are drawn at once.
 
-        plants_per_worker = max(math.floor(len(all_plants)/num_cpu),1)
-        if (worker_id*plants_per_worker) >= len(all_plants): # we have no plants for this worker
-            return []
-        plants_start = plants_per_worker*(worker_id-1)
-        if worker_id == 0: # no previous worker
-            plants_start = 0
-        plants_end = plants_start + plants_per_worker
-        if worker_id == num_cpu-1: # last worker might be an exception
-            plants_end = len(all_plants)
-        plants = all_plants[plants_start:plants_end]
-
-        for plant in plants:
-            if plant in end_product_plants:
-                min_materials = 0  # in potential plants none of the materials might be manufactured
-                max_materials = 1  # to avoid that all materials are manufactured on the plant site and should not be delivered
-            else:
-                min_materials = 1
-                max_materials = len(self.get_materials())
-            random_num_materials = min(random.randint(min_materials, max_materials),
-                                       SndpGraph.INT_MAX_PRODUCTS_IN_ONE_LOCATION)
-            if random_num_materials == 0:
-                continue
-            random_materials = random_subset(self.get_materials(), random_num_materials)  # except the last one
-            for material in random_materials:
-                #plant.add_product(material)
-                add_products.append({'plant': plant.id, 'material': material.id})
-
-            # Define the route to (several or all) potential end product plants for every plant
-            random_num_end_product_plants = random.randint(1, len(end_product_plants))
-            random_end_product_plants = random_subset(end_product_plants, random_num_end_product_plants)
-            # connect the location with the end product plants
-            for end_product_plant in random_end_product_plants:
-                # we need route only if product is produced not in the potential plant locations
-                if plant.id == end_product_plant.id:
-                    continue
-                # routes can be one directional, omit the route if it already exists in another direction
-                key_opposite = '{}-{}'.format(end_product_plant.id, plant.id)
-                if self._routes.get(key_opposite):
-                    continue
-                key = '{}-{}'.format(plant.id, end_product_plant.id)
-                if not self._routes.get(key):  # if the route does not already exist
-                    #self.add_route(Route(plant, end_product_plant, random.randint(1, SNDP_Graph.MAX_DISTANCE)))
-                    shared_add_routes[key] = random.randint(1, SndpGraph.INT_MAX_DISTANCE)
+        :param demand_type: SndpGraph.STR_DEMAND_UNIQUE - different integer demands, num_scen should be smaller than the demand range.
+            STR_DEMAND_REPEATED - integer demands that might repeat, STR_DEMAND_FLOAT - non-integer demands.
+            Both are not limited by the demand range
+        '''
+
+        self._check_demand_type(num_scen, demand_type)
+        with span('stochastic data'):
+            self._set_stochastic_data(_uniform_probabilities(num_scen), self._draw_demands(num_scen, demand_type))
 
-            print(f'Data generated for plant {plant.id}')
+        assert(self._data['NrOfScen'] == num_scen)
+
+    def extend_scenarios(self, new_num_scen, demand_type = STR_DEMAND_UNIQUE):
+
+        '''Add scenarios up to new_num_scen. The current scenarios and their demands are kept (nested scenario sets),
+        the probabilities of all scenarios become uniform again. Only the demands of the new scenarios are drawn.
+        The next export_mpl() copies the last exported Demand.dat and appends the new rows, Prob.dat is written again.
+
+        :param demand_type: see regenerate_stochastic_data(). With STR_DEMAND_UNIQUE the new demands differ from the current ones
+        '''
+
+        num_scen = self._data['NrOfScen']
+        if new_num_scen < num_scen:
+            raise ValueError(f'Cannot extend {num_scen} scenarios to {new_num_scen}. Use regenerate_stochastic_data().')
+        self._check_demand_type(new_num_scen, demand_type)
+        with span('stochastic data'):
+            current_demands = self._data['Demand'].values_array
+            new_demands = self._draw_demands(new_num_scen - num_scen, demand_type, used_demands=current_demands)
+            # a new array: integer and float demands are mixed as floats, the current data is not changed if it fails
+            current_typecode = getattr(current_demands, 'typecode', 'd')
+            typecode = 'd' if 'd' in (current_typecode, new_demands.typecode) else new_demands.typecode
+            demands = array(typecode, current_demands)
+            if new_demands.typecode != typecode:
+                new_demands = array(typecode, new_demands)
+            demands.extend(new_demands)
+            rows_changed = current_typecode != typecode # the current rows are written as floats now
+
+            # the first rows are already in the last exported Demand.dat
+            if self._data_valid_export['Demand'] is not None and not rows_changed:
+                self._data_partial_export['Demand'] = (self._data_valid_export['Demand'], num_scen)
+            self._data_valid_export['ScalarData'] = None
+            self._data_valid_export['Prob'] = None
+            self._data_valid_export['Demand'] = None
+            self._data['NrOfScen'] = new_num_scen
+            self._data['Prob'] = _ScenarioData(_uniform_probabilities(new_num_scen))
+            self._data['Demand'] = _ScenarioData(demands)
+            if self._data_txt is not None:
+                self._data_txt['Prob'] = [_format_scenario_rows(self._data['Prob'].values_array)]
+                if rows_changed:
+                    self._data_txt['Demand'] = [_format_scenario_rows(demands)]
+                else:
+                    self._data_txt['Demand'].append(_format_scenario_rows(new_demands, first_id=num_scen + 1))
+
+    def _check_demand_type(self, num_scen, demand_type):
+        min_scenario_demand, max_scenario_demand = self._scenario_demand_range()
+        if demand_type not in [SndpGraph.STR_DEMAND_UNIQUE, SndpGraph.STR_DEMAND_REPEATED, SndpGraph.STR_DEMAND_FLOAT]:
+            raise ValueError(f'Unknown demand_type {demand_type}.')
+        if demand_type == SndpGraph.STR_DEMAND_UNIQUE and num_scen > (max_scenario_demand - min_scenario_demand):
+            raise ValueError("SndpGraph.FLOAT_MAX_PERCENT_DEMAND_DEFICIT is too small for the num_scen. Use demand_type STR_DEMAND_REPEATED or STR_DEMAND_FLOAT.")
+
+    def _draw_demands(self, num_demands, demand_type, used_demands = ()):
+
+        '''Demands of num_demands scenarios drawn at once.
+
+        :param used_demands: demands of the other scenarios, STR_DEMAND_UNIQUE demands differ from them
+        :return: array('q') of integer or array('d') of STR_DEMAND_FLOAT demands
+        '''
+
+        min_scenario_demand, max_scenario_demand = self._scenario_demand_range()
+        demand_range = range(int(min_scenario_demand), int(max_scenario_demand))
+        if demand_type == SndpGraph.STR_DEMAND_UNIQUE:
+            if not used_demands:
+                return array('q', self._rng.sample(demand_range, num_demands))
+            # draw the positions among the free demands, free demand at position i is i + number of used demands not after it
+            used = sorted(set(demand - demand_range.start for demand in used_demands
+                              if demand == int(demand) and int(demand) in demand_range))
+            shifted_used = [offset - i for i, offset in enumerate(used)]
+            positions = self._rng.sample(range(len(demand_range) - len(used)), num_demands)
+            return array('q', [demand_range.start + position + bisect_right(shifted_used, position) for position in positions])
+        elif demand_type == SndpGraph.STR_DEMAND_REPEATED:
+            return array('q', self._rng.choices(demand_range, k=num_demands))
+        else:
+            demand_width = max_scenario_demand - min_scenario_demand
+            return array('d', [min_scenario_demand + demand_width * self._rng.random() for _ in range(num_demands)])
 
-        return add_products
+    def _set_stochastic_data(self, probabilities, demands):
 
-    def regenerate_stochastic_data(self, num_scen):
-        Timer('Stochastic data generated').start()
+        '''Replace the scenarios with scenarios 1..len(probabilities). The rows of the .dat files are formatted at once.'''
 
+        if len(probabilities) != len(demands):
+            raise ValueError('Number of probabilities and demands should be the same.')
         self._clear_stochastic_data_cache()
+        self._data['NrOfScen'] = len(probabilities)
+        self._data['Prob'] = _ScenarioData(probabilities)
+        self._data['Demand'] = _ScenarioData(demands)
+        if self._data_txt is not None:
+            for name in ['Prob', 'Demand']:
+                self._data_txt[name] = [_format_scenario_rows(self._data[name].values_array)]
+
+    def _scenario_demand_range(self):
         min_scenario_demand = (1-SndpGraph.FLOAT_MAX_PERCENT_DEMAND_DEFICIT) * SndpGraph.FLOAT_PLANT_CAPACITY * len(self.get_end_product_plants())
         max_scenario_demand = 0.9 * SndpGraph.FLOAT_PLANT_CAPACITY * len(self.get_end_product_plants())
-        if num_scen > (max_scenario_demand - min_scenario_demand):
-            raise ValueError("SndpGraph.FLOAT_MAX_PERCENT_DEMAND_DEFICIT is too small for the num_scen.")
-
-        self._scenarios = []
-        probability_per_scenario = 1 / num_scen  # we assume uniformal distribution
-        demands = random.sample(range(int(min_scenario_demand), int(max_scenario_demand)), num_scen)
-        for scenario_id in range(1, num_scen):  # indexing starts from 1, all scenarios except the last one
-            self.add_scenario(_Scenario(scenario_id, probability_per_scenario, demands[scenario_id - 1]))
+        return min_scenario_demand, max_scenario_demand
 
-        left_probability = 1.0 - sum(scen.probability for scen in self.get_scenarios())
-        assert (left_probability > 0)
-        self.add_scenario(_Scenario(num_scen, left_probability, demands[num_scen - 1]))  # last scenario
+    @profiled('visualization_data')
+    def visualization_data(self):
 
-        print(Timer('Stochastic data generated'))
-        Timer('Stochastic data generated').reset()
+        '''Nodes and edges of the visualization as plain strings, e.g., to render it in another thread or process
+        while the graph changes, see render_visualization().
 
-        assert(self._data['NrOfScen'] == num_scen)
-        assert (self._data['NrOfScen'] == len(self.get_scenarios()))
-
-    def visualize(self, format='jpg', view=False, to_file=None):
-        if len(self.get_locations()) > SndpGraph.INT_MAX_LOCATIONS_TO_VISUALIZE:
-            print(f'Visualization of graph {self.name} with {len(self.get_locations())} locations will take to much time and will not be done.')
-            return
-        if self.dot_graph is None:
-            self.dot_graph = Digraph(comment=self.name)
-        # Reload all the data
-        self.dot_graph.clear()
-        self.dot_graph.format = format
+        :return: dict with name, nodes: (id, label, style, color) and edges: (start id, end id, distance)
+        '''
 
         end_product_plants = self.get_end_product_plants()
+        nodes = []
         for location in self.get_locations():
             if location == self.get_end_location():
                 color = 'red'
@@ -527,10 +858,20 @@ class SndpGraph():
             else:
                 color = None
                 style = 'solid'
-            self.dot_graph.node(name=str(location.id), label=str(location), style=style, color=color)
+            nodes.append((str(location.id), str(location), style, color))
+        edges = [(str(route.start.id), str(route.end.id), str(route.distance)) for route in self.get_routes()]
+        return {'name': self.name, 'nodes': nodes, 'edges': edges}
 
-        for route in self.get_routes():
-            self.dot_graph.edge(str(route.start.id), str(route.end.id), label = str(route.distance), len = str(route.distance))
+    @profiled('visualization')
+    def visualize(self, format='jpg', view=False, to_file=None):
+        if len(self.get_locations()) > SndpGraph.INT_MAX_LOCATIONS_TO_VISUALIZE:
+            print(f'Visualization of graph {self.name} with {len(self.get_locations())} locations will take to much time and will not be done.')
+            return
+        try:
+            self.dot_graph = visualization_digraph(self.visualization_data(), format, self.dot_graph)
+        except ImportError:
+            print(f"WARNING: Visualization of {self.name} is skipped. graphviz package is not installed.")
+            return
 
         # print(self.dot_graph.source)
         if to_file is None:
@@ -541,10 +882,18 @@ class SndpGraph():
             print(f"WARNING: Visulalization of {self.name} failed. Due to this error: {e}")
 
 
-    def export_mpl(self, filename : str):
+    @profiled('export_mpl')
+    def export_mpl(self, filename : str, streaming : bool = False):
+
+        '''Export the model formulation to filename.mpl and the data to filename_<data item>.dat files.
+        .dat files that are actual for the current data are not exported again.
 
-        # export .mpl file
-        model_formulation = Path(resource_filename(__name__, 'SNDP_default.mpl')).read_text()
+        :param streaming: format the rows of the .dat files from the data cache and write them in chunks of
+            INT_EXPORT_CHUNK_ROWS rows instead of joining the whole textual data cache in memory.
+            Compact graphs are always exported this way.
+        '''
+
+        out_filenames = {}
 
         # export .dat files
         # scalar
@@ -553,18 +902,14 @@ class SndpGraph():
             out_filename = str(valid_export)
         else:
             out_filename = f'{filename}_ScalarData.dat'
-            dat_file = Path(resource_filename(__name__, 'SNDP_default_ScalarData.dat')).read_text()
-            dat_file_lines = dat_file.split('\n')
-            for data_item_name in ['NrOfLocations', 'NrOfProducts', 'NrOfScen', 'SalesPrice', 'PlantCost', 'PlantCapacity']:
-                # load and modify the data from the current data file
-                data_row = dat_file_lines.index('!' + data_item_name) + 1
+            dat_file_lines, data_rows = _scalar_data_template()
+            dat_file_lines = list(dat_file_lines)
+            for data_item_name, data_row in data_rows.items():
                 dat_file_lines[data_row] = str(self._data[data_item_name])
-            # and write to the new file
             out_file = Path(out_filename)
             out_file.write_text('\n'.join(dat_file_lines))
             self._data_valid_export['ScalarData'] = out_file
-        # update links in the model formulation
-        model_formulation = model_formulation.replace(f'SNDP_default_ScalarData.dat', str(out_filename))
+        out_filenames['ScalarData'] = out_filename
 
         # arrays
         for data_item_name in ['ShipCost', 'ArcProduct', 'arc', 'Prob', 'Demand', 'MaterialReq']:
@@ -573,43 +918,298 @@ class SndpGraph():
                 out_filename = str(valid_export)
             else:
                 out_filename = f'{filename}_{data_item_name}.dat'
-                some_value = next(iter(self._data[data_item_name].values())) # we get dict
-                keys = some_value.keys()
-                first_two_lines = '!{}\n!{}\n'.format(data_item_name, ','.join(keys))
-                dat_contents = first_two_lines + self._data_txt[data_item_name]
-                # and write to the new file
+                first_two_lines = '!{}\n!{}\n'.format(data_item_name, ','.join(SndpGraph._DATA_HEADERS[data_item_name]))
                 out_file = Path(out_filename)
-                out_file.write_text(dat_contents)
+                partial_export = self._data_partial_export.get(data_item_name)
+                if partial_export is not None and partial_export[0].is_file():
+                    # copy the file with the first rows and append the rest, e.g., Demand.dat after extend_scenarios()
+                    partial_file, num_rows = partial_export
+                    if partial_file.resolve() != out_file.resolve():
+                        shutil.copyfile(partial_file, out_file)
+                    with open(out_file, 'a', buffering=SndpGraph.INT_EXPORT_BUFFER_SIZE) as dat_file:
+                        _write_data_rows(dat_file, islice(self._data[data_item_name].values(), num_rows, None))
+                elif streaming or self._data_txt is None:
+                    with open(out_file, 'w', buffering=SndpGraph.INT_EXPORT_BUFFER_SIZE) as dat_file:
+                        dat_file.write(first_two_lines)
+                        _write_data_rows(dat_file, self._data[data_item_name].values())
+                else:
+                    out_file.write_text(first_two_lines + ''.join(self._data_txt[data_item_name]))
                 self._data_valid_export[data_item_name] = out_file
-            # update links in the model formulation
-            model_formulation = model_formulation.replace(f'SNDP_default_{data_item_name}.dat', str(out_filename))
-
-        Path(filename + '.mpl').write_text(model_formulation)
-
-    def adjust_sales_price(self):
+                self._data_partial_export[data_item_name] = None
+            out_filenames[data_item_name] = out_filename
+
+        # export .mpl file with the links to the .dat files
+        model_formulation = list(_mpl_template())
+        for i in range(1, len(model_formulation), 2):
+            model_formulation[i] = str(out_filenames[model_formulation[i]])
+        Path(filename + '.mpl').write_text(''.join(model_formulation))
+
+    @profiled('export_reduced_mpl')
+    def export_reduced_mpl(self, filename : str, num_scen : int, streaming : bool = False):
+
+        '''Export the instance with at most num_scen representative scenarios, see sndp_reduction.reduce_scenarios(),
+        like export_mpl(). The core .dat files of the previous exports are reused. The scenarios of the graph do not change.
+        '''
+
+        with span('scenario reduction'):
+            probabilities, demands = reduce_scenarios(self._data['Prob'].values_array, self._data['Demand'].values_array, num_scen)
+
+        # export the reduced scenarios in place of the current ones and put the current ones back
+        stochastic_names = ['NrOfScen', 'Prob', 'Demand']
+        data = {name: self._data[name] for name in stochastic_names}
+        data_txt = None if self._data_txt is None else {name: self._data_txt[name] for name in ['Prob', 'Demand']}
+        valid_export = {name: self._data_valid_export[name] for name in ['ScalarData', 'Prob', 'Demand']}
+        partial_export = {name: self._data_partial_export.get(name) for name in ['Prob', 'Demand']}
+        try:
+            self._set_stochastic_data(probabilities, demands)
+            self.export_mpl(filename, streaming=streaming)
+        finally:
+            self._data.update(data)
+            if data_txt is not None:
+                self._data_txt.update(data_txt)
+            self._data_valid_export.update(valid_export)
+            self._data_partial_export.update(partial_export)
+
+    @profiled('export_smps')
+    def export_smps(self, filename : str, sto_format : str = 'INDEP'):
+
+        '''Export the instance in SMPS format: filename.cor (free MPS), filename.tim and filename.sto.
+        The core does not depend on the scenarios: it is written once and copied while the core data does not change.
+        Demand of the core is the upper bound of the scenario demands, .sto replaces it with the scenario values.
+        The model has no first stage constraints, but an SMPS period starts with a row: the core gets the redundant
+        first stage row PlantLimit, the number of open plants does not exceed the number of plants.
+
+        :param sto_format: 'INDEP' - discrete distribution of the DemConstr right-hand side,
+            'SCENARIOS' - one scenario block per scenario
+        '''
+
+        if sto_format not in ('INDEP', 'SCENARIOS'):
+            raise ValueError(f"sto_format should be 'INDEP' or 'SCENARIOS', got {sto_format}")
+        core_file = Path(filename + '.cor')
+        time_file = Path(filename + '.tim')
+        valid_export = self._data_valid_export['SMPS']
+        if valid_export is None:
+            self._write_smps_core(core_file, time_file)
+            self._data_valid_export['SMPS'] = core_file
+        elif valid_export.resolve() != core_file.resolve():
+            shutil.copyfile(valid_export, core_file)
+            shutil.copyfile(valid_export.with_suffix('.tim'), time_file)
+
+        # scenarios are streamed: rows are formatted and written in chunks
+        with open(filename + '.sto', 'w', buffering=SndpGraph.INT_EXPORT_BUFFER_SIZE) as sto_file:
+            sto_file.write(f'STOCH         {self.name}\n')
+            if sto_format == 'INDEP':
+                sto_file.write('INDEP         DISCRETE\n')
+                row_template = '    RHS       DemConstr    {1}    STAGE2    {0}\n'
+            else:
+                sto_file.write('SCENARIOS     DISCRETE\n')
+                row_template = ' SC SCEN{2}    ROOT    {0}    STAGE2\n    RHS       DemConstr    {1}\n'
+            scenarios = zip(self._data['Prob'].values(), self._data['Demand'].values())
+            while True:
+                chunk = [row_template.format(probability, demand, scenario_id)
+                         for (scenario_id, probability), (_, demand) in islice(scenarios, SndpGraph.INT_EXPORT_CHUNK_ROWS)]
+                if not chunk:
+                    break
+                sto_file.write(''.join(chunk))
+            sto_file.write('ENDATA\n')
+
+    def _write_smps_core(self, core_file, time_file):
+        core = self._core_model()
+        with open(core_file, 'w', buffering=SndpGraph.INT_EXPORT_BUFFER_SIZE) as cor_file:
+            cor_file.write(f'NAME          {self.name}\nOBJSENSE\n    MAX\nROWS\n N  Profit\n L  PlantLimit\n')
+            cor_file.write(''.join([f' {sense}  {name}\n' for name, sense in core['rows']]))
+            cor_file.write('COLUMNS\n')
+            integer_section = False
+            for column, (column_name, objective, upper_bound, is_integer, entries) in enumerate(core['columns']):
+                if is_integer != integer_section:
+                    cor_file.write(f"    MARKER    'MARKER'    '{'INTORG' if is_integer else 'INTEND'}'\n")
+                    integer_section = is_integer
+                lines = [f'    {column_name}    Profit    {objective}\n']
+                if column < core['first_stage_columns']:
+                    lines.append(f'    {column_name}    PlantLimit    1\n')
+                lines += [f'    {column_name}    {core["rows"][row][0]}    {coefficient}\n' for row, coefficient in entries]
+                cor_file.write(''.join(lines))
+            if integer_section:
+                cor_file.write("    MARKER    'MARKER'    'INTEND'\n")
+            cor_file.write('RHS\n')
+            cor_file.write(f'    RHS    PlantLimit    {core["first_stage_columns"]}\n')
+            cor_file.write(f'    RHS    DemConstr    {self._scenario_demand_range()[1]}\n')
+            cor_file.write('BOUNDS\n')
+            cor_file.write(''.join([f' UP BND    {column_name}    {upper_bound}\n'
+                                    for column_name, _, upper_bound, _, _ in core['columns'] if upper_bound is not None]))
+            cor_file.write('ENDATA\n')
+
+        # all the columns and rows are sorted by stage, PlantLimit is the only first stage row
+        first_stage_column = core['columns'][0][0]
+        second_stage_column = core['columns'][core['first_stage_columns']][0]
+        second_stage_row = core['rows'][0][0]
+        time_file.write_text(f'TIME          {self.name}\n'
+                             f'PERIODS       IMPLICIT\n'
+                             f'    {first_stage_column}    PlantLimit    STAGE1\n'
+                             f'    {second_stage_column}    {second_stage_row}    STAGE2\n'
+                             f'ENDATA\n')
+
+    @profiled('extensive_form')
+    def extensive_form(self):
+
+        '''Extensive form of the model in SNDP_default.mpl with the current data
+        as in-memory sparse matrices, see SndpExtensiveForm. Nothing is written to the disk.'''
+
+        probabilities = [probability for _, probability in self._data['Prob'].values()]
+        demands = [demand for _, demand in self._data['Demand'].values()]
+        return SndpExtensiveForm(self._core_model(), probabilities, demands)
+
+    def _core_model(self):
+        '''Rows and columns of the model in SNDP_default.mpl for a single scenario.
+        The objective row Profit is not included. All the rows belong to the second stage.
+
+        :return: dict with the keys
+            rows: list of (name, sense) tuples, sense is 'E' or 'L'
+            columns: list of (name, objective coefficient, upper bound or None, is integer, [(row index, coefficient), ...]),
+                the first stage columns (OpenProduction) go first
+            first_stage_columns: number of the first stage columns
+            demand_row: index of DemConstr, its right-hand side is the scenario demand, right-hand sides of other rows are 0
+            revenue_columns: indices of the columns Ship[EndProduct, plantLocation, Market], their objective includes sales_price
+            sales_price: sales price in the objective
+        '''
+        market = self.get_end_location().id
+        end_product = self.get_end_product().id
+        plant_ids = [plant.id for plant in self.get_end_product_plants()]
+        material_reqs = list(self._data['MaterialReq'].values())
+
+        rows = []
+        bom_rows = {}
+        for plant_id in plant_ids:
+            for material_id, _ in material_reqs:
+                bom_rows[plant_id, material_id] = len(rows)
+                rows.append((f'BOMConstr[{plant_id},{material_id}]', 'E'))
+        demand_row = len(rows)
+        rows.append(('DemConstr', 'L'))
+        plant_rows = {}
+        for plant_id in plant_ids:
+            plant_rows[plant_id] = len(rows)
+            rows.append((f'PlantConstr[{plant_id}]', 'L'))
+
+        columns = [(f'OpenProduction[{plant_id}]', -self._data['PlantCost'], 1, True, [(plant_rows[plant_id], -self._data['PlantCapacity'])])
+                   for plant_id in plant_ids]
+        revenue_columns = []
+        ship_costs = self._data['ShipCost']
+        for product_id, start_id, finish_id, _ in self._data['ArcProduct'].values():
+            ship_cost = ship_costs.get((start_id, finish_id))
+            objective = -ship_cost[2] if ship_cost is not None else 0 # arcs inside the location have no ShipCost
+            entries = []
+            if product_id == end_product:
+                if finish_id == market:
+                    objective += self.sales_price
+                    revenue_columns.append(len(columns))
+                    entries += [(bom_rows[start_id, material_id], material_req) for material_id, material_req in material_reqs]
+                    entries.append((demand_row, 1))
+                    entries.append((plant_rows[start_id], 1))
+            elif (finish_id, product_id) in bom_rows:
+                entries.append((bom_rows[finish_id, product_id], -1))
+            columns.append((f'Ship[{product_id},{start_id},{finish_id}]', objective, None, False, entries))
+
+        return {'rows': rows, 'columns': columns, 'first_stage_columns': len(plant_ids), 'demand_row': demand_row,
+                'revenue_columns': revenue_columns, 'sales_price': self.sales_price}
+
+    @profiled('adjust_sales_price')
+    def adjust_sales_price(self, solver = None, parallel = 1):
 
         '''Find the smallest value of SalesPrice
         that does not decrease the number of open plants.
-        Motivation: has as small obj value as possible to avoid numerical issues.'''
+        Motivation: has as small obj value as possible to avoid numerical issues.
 
-        try:
-            from sndpgen.sndp_model import SndpModel
-        except ImportError:
-            warn('optconvert is not installed, adjust_sales_price() will not be executed', ImportWarning)
+        The model is solved with OptiMax if optconvert is installed. Otherwise, or if solver is given,
+        the in-memory extensive form is solved with an open-source MILP solver, see sndp_solver.SOLVERS.
+
+        :param solver: name of the solver in sndp_solver.SOLVERS. None - OptiMax or the first available solver
+        :param parallel: number of prices evaluated concurrently, every price in its own process with its own copy of the model.
+            The result is the same as with parallel = 1
+        '''
+
+        if solver is None:
+            try:
+                from sndpgen.sndp_model import SndpModel
+            except ImportError:
+                pass
+            else:
+                self.export_mpl(f'{self.name}')
+                sndp_model = SndpModel(Path(f'{self.name}.mpl'))
+                sndp_model.adjust_sales_price(*self.sales_price_bracket(), parallel=parallel)
+                self.sales_price = sndp_model.data_as_dict['SalesPrice']
+                self._data_valid_export['ScalarData'] = None
+                return
+
+        from sndpgen.sndp_solver import get_solver, search_sales_price, ParallelEvaluator
+        extensive_form = self.extensive_form()
+        sndp_solver = get_solver(extensive_form, solver)
+        if sndp_solver is None:
+            warn('Neither optconvert nor an open-source MILP solver (highspy, scipy) is installed, adjust_sales_price() will not be executed', ImportWarning)
             return
-        self.export_mpl(f'{self.name}')
-        sndp_model = SndpModel(Path(f'{self.name}.mpl'))
-        sndp_model.adjust_sales_price()
-        self.sales_price = sndp_model.data_as_dict['SalesPrice']
+        _, target_open_plants = sndp_solver.evaluate(self.sales_price)
+        if parallel > 1:
+            with ParallelEvaluator(parallel, type(sndp_solver), extensive_form) as evaluator:
+                self.sales_price, _, _ = search_sales_price(sndp_solver.evaluate, self.sales_price, target_open_plants,
+                                                            *self.sales_price_bracket(), parallel=parallel, map_evaluate=evaluator.map)
+        else:
+            self.sales_price, _, _ = search_sales_price(sndp_solver.evaluate, self.sales_price, target_open_plants,
+                                                        *self.sales_price_bracket())
         self._data_valid_export['ScalarData'] = None
 
+    def sales_price_bracket(self):
+
+        '''Bracket of adjust_sales_price() in closed form.
+        Unit cost of the end product in a plant: shipping to the market and the materials
+        from the cheapest supplier (0 if the material is produced in the plant itself).
+
+        :return: (lb, ub_guess)
+            lb - the smallest unit cost plus PlantCost amortized over PlantCapacity.
+                With a lower price every plant makes loss, so the objective value is not positive.
+            ub_guess - the largest unit cost plus PlantCost amortized over the plant share of the smallest scenario demand.
+                The price is expected to keep all the plants profitable, it should be checked with a solve.
+                None if it cannot be estimated, e.g., the smallest scenario demand is 0.
+            The plants that do not get some material, e.g., in the instances of from_dat(), cannot produce and are skipped.
+            (0, None) if no plant can produce.
+        '''
+
+        market = self.get_end_location().id
+        end_product = self.get_end_product().id
+        ship_costs = self._data['ShipCost']
+        # the cheapest delivery of every material to every plant
+        material_costs = {}
+        for product_id, start_id, finish_id, _ in self._data['ArcProduct'].values():
+            if product_id == end_product or finish_id == market:
+                continue
+            cost = 0 if start_id == finish_id else ship_costs[start_id, finish_id][2]
+            key = (finish_id, product_id)
+            if cost < material_costs.get(key, math.inf):
+                material_costs[key] = cost
+        unit_costs = []
+        for plant in self.get_end_product_plants():
+            unit_cost = ship_costs[plant.id, market][2]
+            unit_cost += sum(material_req * material_costs.get((plant.id, material_id), math.inf)
+                             for material_id, material_req in self._data['MaterialReq'].values())
+            if math.isfinite(unit_cost): # otherwise a material is not delivered and the plant cannot produce
+                unit_costs.append(unit_cost)
+        if not unit_costs:
+            return 0, None
+        plant_cost = self._data['PlantCost']
+        plant_capacity = self._data['PlantCapacity']
+        lb = min(unit_costs) + plant_cost / plant_capacity
+        min_demand = min(demand for _, demand in self._data['Demand'].values())
+        plant_units = min(plant_capacity, min_demand / len(unit_costs))
+        ub_guess = max(unit_costs) + plant_cost / plant_units if plant_units > 0 else None
+        return lb, ub_guess
+
     def _clear_nodes_data_cache(self):
         self._data_valid_export['ScalarData'] = None
+        self._data_valid_export['SMPS'] = None
         for name in ['NrOfLocations', 'NrOfProducts']: # basically we do not need to clear it because it cannot be modified:
             self._data[name] = 0
         for name in ['ShipCost', 'ArcProduct', 'arc']: # 'MaterialReq' are excluded since they cannot be modified:
             self._data[name] = {}
-            self._data_txt[name] = ''
+            if self._data_txt is not None:
+                self._data_txt[name] = []
             self._data_valid_export[name] = None
 
     def _clear_stochastic_data_cache(self):
@@ -617,83 +1217,299 @@ class SndpGraph():
         for name in ['NrOfScen']:
             self._data[name] = 0
         for name in ['Prob', 'Demand']:
-            self._data[name] = {}
-            self._data_txt[name] = ''
+            self._data[name] = _ScenarioData()
+            if self._data_txt is not None:
+                self._data_txt[name] = []
             self._data_valid_export[name] = None
+            self._data_partial_export[name] = None
 
     def add_route(self, route):
         if self.get_route(route.start, route.end):
             raise KeyError('Route already exists in the graph.')
         route._graph = self
-        self._routes['{}-{}'.format(route.start.id, route.end.id)] = route
+        self._routes[route.start.id, route.end.id] = route
+        self._routes_view = None
 
         # data cache
-        for name in ['ScalarData', 'ShipCost', 'ArcProduct', 'arc']: # 'MaterialReq' are excluded since they cannot be modified:
+        for name in ['ScalarData', 'ShipCost', 'ArcProduct', 'arc', 'SMPS']: # 'MaterialReq' are excluded since they cannot be modified:
             self._data_valid_export[name] = None
         route.start.update_graph_data_cache(product = None, route = route)
         # we check for duplicates above
-        new_key = f'{route.start.id},{route.end.id}'
-        self._data['ShipCost'][new_key] = {'start': route.start.id, 'finish': route.end.id, 'value': route.distance}
-        self._data_txt['ShipCost'] += f'{new_key},{route.distance}\n'
+        self._add_data_row('ShipCost', (route.start.id, route.end.id), (route.start.id, route.end.id, route.distance))
 
     def add_scenario(self, scenario):
         scenario._graph = self
-        self._scenarios.append(scenario)
 
         # data cache
         self._data['NrOfScen'] += 1
         if scenario.id in self._data['Prob']:
             raise KeyError('Scenario already exists in the graph.')
         assert(scenario.id not in self._data['Demand'] and 'How would this happen if error obove does not raise?')
-        self._data['Prob'][scenario.id] = {'SCEN': scenario.id, 'value': scenario.probability}
-        self._data_txt['Prob'] += f'{scenario.id},{scenario.probability}\n'
-        self._data['Demand'][scenario.id] = {'SCEN': scenario.id, 'value': scenario.demand}
-        self._data_txt['Demand'] += f'{scenario.id},{scenario.demand}\n'
+        self._add_data_row('Prob', scenario.id, (scenario.id, scenario.probability))
+        self._add_data_row('Demand', scenario.id, (scenario.id, scenario.demand))
+
+    def _add_data_row(self, name, key, row):
+        self._data[name][key] = row
+        if self._data_txt is not None:
+            self._data_txt[name].append(_format_data_row(row))
 
     def get_products(self):
-        return list(self._products.values())
+        return self._products_view
 
     def get_materials(self):
-        return self.get_products()[:-1]  # all except the last products which are the end product
+        return self._materials_view
 
     def get_product(self, id):
         product = self._products.get(id)
         return product
 
     def get_end_product(self):
-        return self.get_products()[-1]
+        return self._products_view[-1]
 
     def get_locations(self):
-        return list(self._locations.values())
+        return self._locations_view
 
     def get_plants(self):
-        return self.get_locations()[:-1] # last location is end location
+        return self._plants_view
 
     def get_end_product_plants(self):
-        return self._end_product_plants
+        return self._end_product_plants.keys()
 
     def get_location(self, id):
         location = self._locations.get(id)
         if location is None:
-            raise (f'Location with {id} was not found.')
+            raise KeyError(f'Location with {id} was not found.')
         return location
 
     def get_end_location(self):
-        return self.get_locations()[-1]
+        return self._locations_view[-1]
 
     def get_routes(self):
-        return list(self._routes.values())
+        if self._routes_view is None:
+            self._routes_view = tuple(self._routes.values())
+        return self._routes_view
 
     def get_route(self, start, end):
         if not isinstance(start, _Location) or not isinstance(end, _Location):
-            raise('Start and end arguments should be Location objects')
-        key = '{}-{}'.format(start.id, end.id)
-        return self._routes.get(key)
+            raise TypeError('Start and end arguments should be Location objects')
+        return self._routes.get((start.id, end.id))
 
     def get_scenarios(self):
-        return self._scenarios[:]
+        # the scenarios are built from the data cache, again only after the scenarios changed:
+        # the Prob data is replaced by every change except add_scenario() that appends to it
+        probabilities = self._data['Prob']
+        if self._scenarios_view is None or self._scenarios_view[0] is not probabilities or self._scenarios_view[1] != len(probabilities):
+            scenarios = tuple(_Scenario(scenario_id, probability, demand) for (scenario_id, probability), (_, demand)
+                              in zip(probabilities.values(), self._data['Demand'].values()))
+            for scenario in scenarios:
+                scenario._graph = self
+            self._scenarios_view = (probabilities, len(probabilities), scenarios)
+        return self._scenarios_view[2]
+
+def generate_plant_data(base_seed, plant_ids, end_product_plant_ids, material_ids, max_products_in_one_location, max_distance):
+    '''Generates the materials and the routes of the plants, in a worker process if num_cpu > 1.
+    Every plant uses its own random stream derived from base_seed and the plant id.
+
+    :return: list of (plant_id, material_ids, routes) tuples, routes are (end_product_plant_id, distance) tuples
+    '''
+    end_product_plant_set = set(end_product_plant_ids)
+    result = []
+    for plant_id in plant_ids:
+        rng = random.Random(f'{base_seed}-{plant_id}')
+        if plant_id in end_product_plant_set:
+            min_materials = 0  # in potential plants none of the materials might be manufactured
+            max_materials = math.ceil(len(material_ids)/4) # to avoid that all materials are manufactured on the plant site and should not be delivered
+        else:
+            min_materials = 1
+            max_materials = len(material_ids)
+        random_num_materials = min(rng.randint(min_materials, max_materials), max_products_in_one_location)
+        if random_num_materials == 0: # no materials produced, lets go to the next plant
+            continue
+
+        # Define the route to (several or all) potential end product plants for every plant
+        # existence of the route in another direction is checked when routes are added to the graph
+        random_num_end_product_plants = rng.randint(1, len(end_product_plant_ids))
+        random_end_product_plant_ids = random_subset(end_product_plant_ids, random_num_end_product_plants, rng)
+        routes = [(end_product_plant_id, rng.randint(1, max_distance)) for end_product_plant_id in random_end_product_plant_ids
+                  if end_product_plant_id != plant_id]
+
+        # Define materials to produce
+        random_material_ids = random_subset(material_ids, random_num_materials, rng)
+        result.append((plant_id, random_material_ids, routes))
+
+    return result
+
+def _profiled_generate_plant_data(trace_memory, *args):
+    # generate_plant_data() in a worker process and the report of its phases for the Profiler of the main process
+    with Profiler(trace_memory) as profiler:
+        with span('worker'):
+            plant_data = generate_plant_data(*args)
+    return plant_data, profiler.report()
+
+
+def _parse_number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _mpl_data_files(prefix):
+
+    '''{data item: path of the .dat file} of the instance, see SndpGraph.from_dat()'''
+
+    data_files = {name: Path(f'{prefix}_{name}.dat') for name in ['ScalarData', 'MaterialReq', 'Prob', 'Demand', 'ShipCost', 'ArcProduct', 'arc']}
+    mpl_file = Path(f'{prefix}.mpl')
+    if not mpl_file.is_file():
+        return data_files
+    # e.g., Prob[SCEN] := SPARSEFILE("SNDP_10_5_0_1_Prob.dat"); all scalar data items are in one file
+    references = re.findall(r'(\w+)(?:\[[^\]]*\])?\s*:=\s*(?:DATAFILE|SPARSEFILE|INDEXFILE)\("([^"]+)"\)', mpl_file.read_text())
+    for name, filename in references:
+        if name == 'NrOfScen':
+            name = 'ScalarData'
+        if name not in data_files:
+            continue
+        # the path in the .mpl file is relative to the folder of the export, try the folder of the .mpl file first
+        candidates = [mpl_file.parent / filename, Path(filename), mpl_file.parent / Path(filename).name]
+        data_files[name] = next((file for file in candidates if file.is_file()), candidates[0])
+    return data_files
+
+
+def _read_scalar_dat(path):
+
+    '''{name: value} of the file with !name lines followed by the value line, e.g., _ScalarData.dat'''
+
+    lines = Path(path).read_text().split('\n')
+    return {lines[i][1:]: _parse_number(lines[i + 1]) for i in range(0, len(lines) - 1, 2) if lines[i].startswith('!')}
+
+
+def _read_array_dat(path, name):
+
+    '''Values of the rows of the .dat file written by SndpGraph.export_mpl() in one flat list.
+    The whole file is parsed at once: '!name', '!header' and then the rows of comma separated numbers
+    are a json array if the newlines are replaced with commas.'''
+
+    text = Path(path).read_text()
+    first_line, header, body = (text.split('\n', 2) + ['', ''])[:3]
+    if first_line != f'!{name}' or header != '!' + ','.join(SndpGraph._DATA_HEADERS[name]):
+        raise ValueError(f'{path} is not a {name} data file.')
+    body = body.rstrip('\n').replace('\n', ',')
+    try:
+        values = json.loads(f'[{body}]')
+    except json.JSONDecodeError: # numbers that are not valid in json, e.g., with leading zeros
+        values = [_parse_number(token) for token in body.split(',')] if body else []
+    if len(values) % len(SndpGraph._DATA_HEADERS[name]):
+        raise ValueError(f'Every row of {path} should have {len(SndpGraph._DATA_HEADERS[name])} values.')
+    return values
+
+
+def _random_state(state):
+    # state of random.Random from its json form: the lists back to tuples
+    version, internal_state, gauss_next = state
+    return version, tuple(internal_state), gauss_next
+
+
+def _rows(values, row_length):
+
+    '''Tuples of row_length consecutive values of the flat sequence.'''
+
+    iterator = iter(values)
+    return zip(*[iterator] * row_length)
+
+
+def visualization_digraph(visualization_data, format = 'jpg', dot_graph = None):
+
+    '''graphviz Digraph of SndpGraph.visualization_data(). dot_graph is cleared and reused if given'''
+
+    if dot_graph is None:
+        from graphviz import Digraph # optional, only for the visualization
+        dot_graph = Digraph(comment=visualization_data['name'])
+    # Reload all the data
+    dot_graph.clear()
+    dot_graph.format = format
+    for node_id, label, style, color in visualization_data['nodes']:
+        dot_graph.node(name=node_id, label=label, style=style, color=color)
+    for start_id, end_id, distance in visualization_data['edges']:
+        dot_graph.edge(start_id, end_id, label = distance, len = distance)
+    return dot_graph
+
+
+def render_visualization(visualization_data, format = 'jpg', to_file = None):
+
+    '''Render SndpGraph.visualization_data() to to_file (dot source) and to_file.format, e.g., in a background thread.
+    Unlike SndpGraph.visualize(), the errors of graphviz are raised.
+
+    :param to_file: default - name of the graph
+    :return: path of the rendered file
+    '''
+
+    dot_graph = visualization_digraph(visualization_data, format)
+    return dot_graph.render(to_file or visualization_data['name'])
+
+
+def _read_resource(name):
+    from importlib.resources import files # only the first export reads the templates
+    return files(__package__).joinpath(name).read_text()
+
+
+@lru_cache(maxsize=None)
+def _mpl_template():
+
+    '''SNDP_default.mpl split at the links to the default .dat files, read once per process.
+    The text parts are at the even indices, the names of the data items of the links at the odd ones.'''
+
+    data_item_names = ['ScalarData', 'ShipCost', 'ArcProduct', 'arc', 'Prob', 'Demand', 'MaterialReq']
+    pattern = r'SNDP_default_({})\.dat'.format('|'.join(data_item_names))
+    return tuple(re.split(pattern, _read_resource('SNDP_default.mpl')))
+
+
+@lru_cache(maxsize=None)
+def _scalar_data_template():
+
+    '''Lines of SNDP_default_ScalarData.dat and {data item name: index of its value line}, read once per process'''
+
+    dat_file_lines = tuple(_read_resource('SNDP_default_ScalarData.dat').split('\n'))
+    data_rows = {data_item_name: dat_file_lines.index('!' + data_item_name) + 1
+                 for data_item_name in ['NrOfLocations', 'NrOfProducts', 'NrOfScen', 'SalesPrice', 'PlantCost', 'PlantCapacity']}
+    return dat_file_lines, data_rows
+
+
+def _format_scenario_rows(values, first_id = 1):
+
+    '''Rows of Prob.dat or Demand.dat of scenarios first_id..first_id+len(values)-1, the same text as _format_data_row() of every row.'''
+
+    scenario_ids = range(first_id, first_id + len(values))
+    return '%d,%r\n' * len(values) % tuple(value for row in zip(scenario_ids, values) for value in row)
+
+
+def _uniform_probabilities(num_scen):
+
+    '''Probabilities of num_scen equally likely scenarios, the last one gets the rest to 1.0'''
+
+    probabilities = array('d', [1 / num_scen]) * (num_scen - 1) # all scenarios except the last one
+    left_probability = 1.0 - sum(probabilities)
+    assert (left_probability > 0)
+    probabilities.append(left_probability) # last scenario
+    return probabilities
+
+
+def _write_data_rows(dat_file, rows):
+
+    '''Format the rows and write them to the open .dat file in chunks of SndpGraph.INT_EXPORT_CHUNK_ROWS rows'''
+
+    rows = iter(rows)
+    while True:
+        chunk = [_format_data_row(row) for row in islice(rows, SndpGraph.INT_EXPORT_CHUNK_ROWS)]
+        if not chunk:
+            break
+        dat_file.write(''.join(chunk))
+
+
+def _format_data_row(row):
+    '''Row of the array data as a line of the .dat file'''
+    return ','.join(map(str, row)) + '\n'
 
-def random_subset( iterator, K ):
+def random_subset( iterator, K, rng = random ):
     result = []
     N = 0
 
@@ -702,8 +1518,8 @@ def random_subset( iterator, K ):
         if len( result ) < K:
             result.append( item )
         else:
-            s = int(random.random() * N)
+            s = int(rng.random() * N)
             if s < K:
                 result[ s ] = item
 
-    return result
\ No newline at end of file
+    return result
@@ -1,4 +1,7 @@
-import math
+import shutil
+import tempfile
+from pathlib import Path
+from sndpgen.sndp_solver import search_sales_price, ParallelEvaluator
 optconvert_installed = True
 try:
     from optconvert import MplWithExtData
@@ -22,46 +25,37 @@ if optconvert_installed:
         -------
         adjust_sales_price
             find the smallest value of SalesPrice that does not decrease the number of open plants.
+        evaluate(sales_price)
+            solve the model with the given SalesPrice, returns (objective value, number of open plants)
         """
 
-        def adjust_sales_price(self):
+        def adjust_sales_price(self, lb=0, ub_guess=None, parallel=1):
 
             '''Find the smallest value of FLOAT_SALES_PRICE
             that does not change the set of open plants.
-            Motivation: has as small obj value as possible to avoid numerical issues.'''
+            Motivation: has as small obj value as possible to avoid numerical issues.
 
+            lb, ub_guess: bracket of the search, see SndpGraph.sales_price_bracket()
+            parallel: number of prices evaluated concurrently, every price in its own process with its own copy of the model'''
+
+            target_open_plants = len(self.solution_open_production) # not smaller than with init. price
             sales_price = self.data_as_dict['SalesPrice']
-            ub = sales_price
-            lb = 0
-            target_open_plants  = len(self.solution_open_production) # not smaller than with init. price
-            step = sales_price/2
-            direction = 'down'
-            iter_counter = 0
-            while True:
-                if direction == 'up':
-                    sales_price += step
-                else:
-                    sales_price -= step
-                self.set_ext_data({'SalesPrice': sales_price})
-                self.solve()
-                obj_value = self.obj_value
-                num_open_plants = len(self.solution_open_production)  # not smaller than with init. price
-                if obj_value > 0 and num_open_plants >= target_open_plants:
-                    if direction == 'up':
-                        step /= 2
-                        ub = sales_price
-                    direction = 'down'
-                else:
-                    if direction == 'down':
-                        step /= 2
-                        lb = sales_price
-                    direction = 'up'
-                # check the gap
-                assert(ub - lb > 0)
-                iter_counter += 1
-                if ub - lb <= 5:
-                    self.set_ext_data({'SalesPrice': math.ceil(ub)})
-                    break
+            if parallel > 1:
+                directory = tempfile.mkdtemp(dir=self._file.parent)
+                try:
+                    with ParallelEvaluator(parallel, _copy_model, self._file, directory) as evaluator:
+                        sales_price, _, _ = search_sales_price(self.evaluate, sales_price, target_open_plants, lb, ub_guess,
+                                                               parallel=parallel, map_evaluate=evaluator.map)
+                finally:
+                    shutil.rmtree(directory, ignore_errors=True)
+            else:
+                sales_price, _, _ = search_sales_price(self.evaluate, sales_price, target_open_plants, lb, ub_guess)
+            self.set_ext_data({'SalesPrice': sales_price})
+
+        def evaluate(self, sales_price):
+            self.set_ext_data({'SalesPrice': sales_price})
+            self.solve()
+            return self.obj_value, len(self.solution_open_production)
 
         @property
         def data_as_dict(self) -> dict:
@@ -86,4 +80,13 @@ if optconvert_installed:
             for variable, value in self.solution.items():
                 if 'OpenProd' in variable and value == 1.0:
                     open_production.append(variable)
-            return open_production
\ No newline at end of file
+            return open_production
+
+    def _copy_model(file, directory):
+
+        '''Copy of the model in a new subfolder of directory.
+        set_ext_data() rewrites the .dat files, so the processes of ParallelEvaluator should not share them.'''
+
+        copy = Path(tempfile.mkdtemp(dir=directory)) / Path(file).name
+        SndpModel(Path(file)).export(copy)
+        return SndpModel(copy)
@@ -0,0 +1,272 @@
+import functools
+from contextlib import contextmanager
+import json
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+INT_REPORT_VERSION = 1
+FLOAT_PROGRESS_INTERVAL = 0.5 # sec between two calls of the progress callback for the same task
+
+_state = threading.local() # profiler and open spans of the thread, times of the last progress calls
+_progress = {'callback': None, 'interval': FLOAT_PROGRESS_INTERVAL}
+
+
+class Span():
+    """
+    Aggregated measurements of a phase. The runs of the phase with the same parent are summed up.
+
+    Attributes
+    ----------
+    name : str
+    calls : int
+        number of runs of the phase
+    wall, cpu : float
+        total wall time and CPU time of the thread, sec
+    memory_peak : int or None
+        the largest increase of the traced memory during a run, bytes. None if the memory is not traced
+    children : dict
+        name: Span of the nested phases
+
+    Methods
+    -------
+    child(name)
+        Span of the nested phase, created on the first call
+    as_dict()
+        json-compatible report of the span and its children
+    merge(report)
+        add the measurements of as_dict() of another span, e.g., from a worker process
+    """
+
+    __slots__ = ('name', 'calls', 'wall', 'cpu', 'memory_peak', 'children')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.memory_peak = None
+        self.children = {}
+
+    def child(self, name):
+        child = self.children.get(name)
+        if child is None:
+            child = self.children[name] = Span(name)
+        return child
+
+    def as_dict(self):
+        return {'name': self.name, 'calls': self.calls, 'wall': self.wall, 'cpu': self.cpu,
+                'memory_peak': self.memory_peak, 'children': [child.as_dict() for child in self.children.values()]}
+
+    def merge(self, report):
+        self.calls += report['calls']
+        self.wall += report['wall']
+        self.cpu += report['cpu']
+        if report['memory_peak'] is not None:
+            self.memory_peak = max(self.memory_peak or 0, report['memory_peak'])
+        for child_report in report['children']:
+            self.child(child_report['name']).merge(child_report)
+
+    def __str__(self):
+        return f'{self.name}: {self.wall:0.4f}'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class span():
+    """
+    Context manager that measures a run of a phase:
+
+    with span('export_mpl') as phase:
+        ...
+    print(f'Exported: {phase.wall:0.4f}')
+
+    Inside an active Profiler of the thread the run is added to the Span of the phase, a child of the Span
+    of the enclosing phase. Without a profiler only the wall and CPU time of the run are measured.
+
+    Attributes
+    ----------
+    name : str
+    wall, cpu : float
+        wall time and CPU time of the run, sec. Available after the exit
+    """
+
+    __slots__ = ('name', 'wall', 'cpu', '_start_wall', '_start_cpu', '_node', '_start_memory', '_max_memory')
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self._node = None
+
+    def __enter__(self):
+        stack = getattr(_state, 'stack', None)
+        if stack:
+            parent = stack[-1]
+            self._node = parent._node.child(self.name)
+            if _state.profiler.trace_memory:
+                # the peak of tracemalloc is global: fold it into the parent before measuring from the start of this run
+                current, peak = tracemalloc.get_traced_memory()
+                parent._max_memory = max(parent._max_memory, peak)
+                tracemalloc.reset_peak()
+                self._start_memory = self._max_memory = current
+            stack.append(self)
+        self._start_cpu = time.thread_time()
+        self._start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall = time.perf_counter() - self._start_wall
+        self.cpu = time.thread_time() - self._start_cpu
+        node = self._node
+        if node is None:
+            return
+        node.calls += 1
+        node.wall += self.wall
+        node.cpu += self.cpu
+        stack = _state.stack
+        stack.pop()
+        if _state.profiler.trace_memory:
+            self._max_memory = max(self._max_memory, tracemalloc.get_traced_memory()[1])
+            node.memory_peak = max(node.memory_peak or 0, self._max_memory - self._start_memory)
+            if stack:
+                stack[-1]._max_memory = max(stack[-1]._max_memory, self._max_memory)
+        self._node = None
+
+
+def active_profiler():
+
+    '''Profiler of the thread or None, e.g., to profile the worker processes and merge their reports'''
+
+    return getattr(_state, 'profiler', None)
+
+
+def profiled(name):
+
+    '''Decorator that runs the function in span(name)'''
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Profiler():
+    """
+    Collects the spans of the thread into a tree:
+
+    with Profiler(trace_memory=True) as profiler:
+        graph = SndpGraph(...)
+    profiler.write('profile.json')
+
+    Attributes
+    ----------
+    root : Span
+        the whole profiled run, the phases are its children
+    trace_memory : bool
+        measure the memory peaks with tracemalloc. The traced memory is shared by all the threads of the process,
+        so the peaks of the concurrent phases include each other
+
+    Methods
+    -------
+    merge(report)
+        add the phases of report() of another profiler, e.g., of a worker process, to the open phase
+    report()
+        json-compatible dict
+    write(path, **metadata)
+        save the report and the metadata as json
+    """
+
+    def __init__(self, trace_memory = False):
+        self.trace_memory = trace_memory
+        self.root = Span('total')
+        self._root_span = None
+        self._previous = None
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        self._previous = (getattr(_state, 'profiler', None), getattr(_state, 'stack', None))
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        root_span = self._root_span = span(self.root.name)
+        root_span._node = self.root
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            root_span._start_memory = root_span._max_memory = tracemalloc.get_traced_memory()[0]
+        _state.profiler = self
+        _state.stack = [root_span]
+        root_span._start_cpu = time.thread_time()
+        root_span._start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._root_span.__exit__(exc_type, exc_value, traceback)
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        _state.profiler, _state.stack = self._previous
+
+    def merge(self, report):
+        stack = getattr(_state, 'stack', None)
+        node = stack[-1]._node if stack and _state.profiler is self else self.root
+        for child_report in report['spans']['children']:
+            node.child(child_report['name']).merge(child_report)
+
+    def report(self):
+        return {'version': INT_REPORT_VERSION, 'trace_memory': self.trace_memory, 'spans': self.root.as_dict()}
+
+    def write(self, path, **metadata):
+        Path(path).write_text(json.dumps(dict(self.report(), **metadata), indent=1))
+
+
+def set_progress_callback(callback, interval = FLOAT_PROGRESS_INTERVAL):
+
+    '''Set the function that reports the progress of the long tasks, e.g., of the generation of the plants.
+    No progress is reported by default, sndp_gen shows the progress bars.
+
+    :param callback: callback(task, current, total) or None to report nothing
+    :param interval: minimal time between two calls for the same task in the same thread, sec.
+        The last step of a task is always reported
+    :return: the previous (callback, interval)
+    '''
+
+    previous = (_progress['callback'], _progress['interval'])
+    _progress['callback'] = callback
+    _progress['interval'] = interval
+    return previous
+
+
+@contextmanager
+def progress_callback(callback, interval = FLOAT_PROGRESS_INTERVAL):
+
+    '''Context manager that sets the progress callback, see set_progress_callback(), and restores the previous one on exit'''
+
+    previous = set_progress_callback(callback, interval)
+    try:
+        yield
+    finally:
+        set_progress_callback(*previous)
+
+
+def report_progress(task, current, total):
+
+    '''Call the progress callback for the step current of total unless the task was reported less than interval ago'''
+
+    callback = _progress['callback']
+    if callback is None:
+        return
+    now = time.perf_counter()
+    last_calls = getattr(_state, 'progress', None)
+    if last_calls is None:
+        last_calls = _state.progress = {}
+    last_call = last_calls.get(task)
+    if current < total and last_call is not None and now - last_call < _progress['interval']:
+        return
+    last_calls[task] = None if current >= total else now
+    callback(task, current, total)
@@ -0,0 +1,63 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from math import fsum
+
+INT_MAX_ITERATIONS = 1000
+
+
+def reduce_scenarios(probabilities, demands, num_scen, max_iterations = INT_MAX_ITERATIONS):
+
+    '''Reduce the scenarios to at most num_scen representative scenarios with 1-D k-means on the demand.
+
+    Demand is the only stochastic value, so the optimal clusters are intervals of the sorted demands.
+    The scenarios are sorted once, afterwards every iteration moves the interval boundaries to the midpoints
+    between the probability-weighted means of the neighbouring clusters and costs O(num_scen * log(len(demands)))
+    thanks to the prefix sums of the probabilities and of the weighted demands.
+
+    :param probabilities: scenario probabilities
+    :param demands: scenario demands
+    :param num_scen: number of the clusters. Less scenarios are returned if there are less different demands
+    :param max_iterations: iterations of k-means, the clusters usually stop changing after a few dozens
+    :return: (probabilities, demands) of the reduced scenarios ordered by the demand. Probability of a scenario
+        is the probability of its cluster, demand is the demand of the original scenario that is the closest to the mean of the cluster
+    '''
+
+    if len(probabilities) != len(demands):
+        raise ValueError('Number of probabilities and demands should be the same.')
+    if num_scen < 1:
+        raise ValueError('num_scen should be at least 1.')
+    num_original = len(demands)
+    order = sorted(range(num_original), key=demands.__getitem__)
+    sorted_demands = [demands[i] for i in order]
+    sorted_probabilities = [probabilities[i] for i in order]
+    cum_probabilities = list(accumulate(sorted_probabilities, initial=0.0))
+    cum_masses = list(accumulate((probabilities[i] * demands[i] for i in order), initial=0.0))
+
+    def mean(start, end):
+        return (cum_masses[end] - cum_masses[start]) / (cum_probabilities[end] - cum_probabilities[start])
+
+    # start with the clusters of equal probability
+    total_probability = cum_probabilities[-1]
+    bounds = [0] + [bisect_left(cum_probabilities, total_probability * i / num_scen, 1, num_original)
+                    for i in range(1, num_scen)] + [num_original]
+    for _ in range(max_iterations):
+        means = [mean(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+        new_bounds = [0] + [bisect_right(sorted_demands, (left + right) / 2) for left, right in zip(means, means[1:])] + [num_original]
+        if new_bounds == bounds:
+            break
+        bounds = new_bounds
+
+    reduced_probabilities = array('d')
+    reduced_demands = []
+    for start, end in zip(bounds, bounds[1:]):
+        if start == end:
+            continue
+        cluster_mean = mean(start, end)
+        closest = min(bisect_left(sorted_demands, cluster_mean, start, end), end - 1)
+        if closest > start and cluster_mean - sorted_demands[closest - 1] <= sorted_demands[closest] - cluster_mean:
+            closest -= 1
+        reduced_probabilities.append(fsum(sorted_probabilities[start:end])) # exact, the prefix sums accumulate rounding errors
+        reduced_demands.append(sorted_demands[closest])
+    typecode = getattr(demands, 'typecode', 'q' if all(isinstance(demand, int) for demand in reduced_demands) else 'd')
+    return reduced_probabilities, array(typecode, reduced_demands)
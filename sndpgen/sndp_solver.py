@@ -0,0 +1,235 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+from sndpgen.sndp_profile import span
+
+
+class HighsSolver():
+    """
+    Solves SndpExtensiveForm with HiGHS (highspy).
+    The model is passed to HiGHS once. Between the solves only the sales price in the objective changes,
+    so the previous solution stays feasible and is given to HiGHS as the starting incumbent.
+
+    Methods
+    -------
+    evaluate(sales_price)
+        solve the model with the given sales price, returns (objective value, number of open plants)
+    """
+
+    name = 'highs'
+
+    @staticmethod
+    def is_available():
+        try:
+            import highspy
+        except ImportError:
+            return False
+        return True
+
+    def __init__(self, extensive_form):
+        import highspy
+        import numpy as np
+        self._np = np
+        self._extensive_form = extensive_form
+        self._optimal = highspy.HighsModelStatus.kOptimal
+        # view of the objective, set_sales_price() changes it in place
+        self._objective = np.frombuffer(extensive_form.objective, dtype=np.float64)
+        self._highs = highspy.Highs()
+        self._highs.setOptionValue('output_flag', False)
+        self._solution = None
+
+        lp = highspy.HighsLp()
+        lp.num_col_ = extensive_form.num_cols
+        lp.num_row_ = extensive_form.num_rows
+        lp.sense_ = highspy.ObjSense.kMaximize
+        lp.col_cost_ = self._objective
+        lp.col_lower_ = np.asarray(extensive_form.col_lower)
+        lp.col_upper_ = np.asarray(extensive_form.col_upper)
+        lp.row_lower_ = np.asarray(extensive_form.row_lower)
+        lp.row_upper_ = np.asarray(extensive_form.row_upper)
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+        lp.a_matrix_.start_ = np.asarray(extensive_form.indptr, dtype=np.int32)
+        lp.a_matrix_.index_ = np.asarray(extensive_form.indices, dtype=np.int32)
+        lp.a_matrix_.value_ = np.asarray(extensive_form.data)
+        lp.integrality_ = [highspy.HighsVarType.kInteger if is_integer else highspy.HighsVarType.kContinuous
+                           for is_integer in extensive_form.integrality]
+        self._highs.passModel(lp)
+
+    def evaluate(self, sales_price):
+        np = self._np
+        changed_cols = self._extensive_form.set_sales_price(sales_price)
+        indices = np.asarray(changed_cols, dtype=np.int32)
+        self._highs.changeColsCost(len(indices), indices, self._objective[indices])
+        if self._solution is not None: # warm start: constraints did not change, previous solution is feasible
+            self._highs.setSolution(self._solution)
+        self._highs.run()
+        model_status = self._highs.getModelStatus()
+        if model_status != self._optimal:
+            self._solution = None
+            raise RuntimeError(f'MILP was not solved: {self._highs.modelStatusToString(model_status)}')
+        self._solution = self._highs.getSolution()
+        obj_value = self._highs.getInfo().objective_function_value
+        num_first_stage_cols = self._extensive_form.num_first_stage_cols
+        num_open_plants = sum(1 for value in list(self._solution.col_value)[:num_first_stage_cols] if value > 0.5)
+        return obj_value, num_open_plants
+
+
+class ScipySolver():
+    """
+    Solves SndpExtensiveForm with scipy.optimize.milp (HiGHS bundled with scipy). No warm start.
+
+    Methods
+    -------
+    evaluate(sales_price)
+        solve the model with the given sales price, returns (objective value, number of open plants)
+    """
+
+    name = 'scipy'
+
+    @staticmethod
+    def is_available():
+        try:
+            from scipy.optimize import milp
+        except ImportError:
+            return False
+        return True
+
+    def __init__(self, extensive_form):
+        import numpy as np
+        from scipy.optimize import LinearConstraint, Bounds
+        self._np = np
+        self._extensive_form = extensive_form
+        self._constraints = LinearConstraint(extensive_form.to_scipy(), np.asarray(extensive_form.row_lower),
+                                             np.asarray(extensive_form.row_upper))
+        self._bounds = Bounds(np.asarray(extensive_form.col_lower), np.asarray(extensive_form.col_upper))
+        self._integrality = np.asarray(extensive_form.integrality)
+
+    def evaluate(self, sales_price):
+        from scipy.optimize import milp
+        self._extensive_form.set_sales_price(sales_price)
+        result = milp(-self._np.asarray(self._extensive_form.objective), constraints=self._constraints,
+                      integrality=self._integrality, bounds=self._bounds)
+        if result.x is None:
+            raise RuntimeError(f'MILP was not solved: {result.message}')
+        num_first_stage_cols = self._extensive_form.num_first_stage_cols
+        num_open_plants = sum(1 for value in result.x[:num_first_stage_cols] if value > 0.5)
+        return -result.fun, num_open_plants
+
+
+# solvers in the order of preference, other solvers with the same interface can be registered here
+SOLVERS = {HighsSolver.name: HighsSolver, ScipySolver.name: ScipySolver}
+
+
+def get_solver(extensive_form, name=None):
+
+    '''Solver for the extensive form.
+
+    :param name: key in SOLVERS. None - the first available solver
+    :return: solver object or None if no solver is available
+    '''
+
+    if name is not None:
+        solver_class = SOLVERS[name]
+        if not solver_class.is_available():
+            raise ImportError(f'Solver {name} is not installed.')
+        return solver_class(extensive_form)
+    for solver_class in SOLVERS.values():
+        if solver_class.is_available():
+            return solver_class(extensive_form)
+    return None
+
+
+class ParallelEvaluator():
+    """
+    Pool of processes that evaluate sales prices. Every process builds its own model with factory(*args),
+    so the models are not shared, e.g., ParallelEvaluator(4, HighsSolver, extensive_form).
+    Use as a context manager.
+
+    Methods
+    -------
+    map(sales_prices)
+        list of evaluate(sales_price) of the processes' models, the prices are evaluated concurrently
+    """
+
+    def __init__(self, num_processes, factory, *args):
+        self._executor = ProcessPoolExecutor(num_processes, initializer=_init_worker, initargs=(factory, args))
+
+    def map(self, sales_prices):
+        return list(self._executor.map(_evaluate_in_worker, sales_prices))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown()
+
+
+_worker_model = None # model of the ParallelEvaluator process
+
+
+def _init_worker(factory, args):
+    global _worker_model
+    _worker_model = factory(*args)
+
+
+def _evaluate_in_worker(sales_price):
+    return _worker_model.evaluate(sales_price)
+
+
+def search_sales_price(evaluate, sales_price, target_open_plants, lb = 0, ub_guess = None, tolerance = 5,
+                       parallel = 1, map_evaluate = None):
+
+    '''Find the smallest value of sales price that keeps the objective value positive
+    and does not decrease the number of open plants below target_open_plants.
+
+    The bracket [lb, sales_price] is divided into steps not longer than tolerance and the smallest good step is searched.
+    Every round evaluates parallel prices and shrinks the bracket by the factor of parallel + 1 (bisection if parallel is 1).
+    The result does not depend on parallel.
+
+    :param evaluate: function(sales_price) -> (objective value, number of open plants)
+    :param sales_price: initial sales price, upper end of the bracket
+    :param target_open_plants: number of open plants with the initial sales price
+    :param lb: sales price that is known to be too low, e.g., SndpGraph.sales_price_bracket()
+    :param ub_guess: estimation of the upper end of the bracket. It is checked in the first round:
+        the bracket becomes [lb, ub_guess] or [ub_guess, sales_price]. Ignored if it is not finite or outside of the bracket
+    :param parallel: number of prices evaluated in one round
+    :param map_evaluate: function(list of sales prices) -> list of evaluate() results, e.g., ParallelEvaluator.map.
+        None - the prices are evaluated one by one with evaluate
+    :return: (adjusted sales price, number of solves, number of rounds).
+        Every round is also measured as span 'sales price round' in an active Profiler
+    '''
+
+    if parallel < 1:
+        raise ValueError('parallel should be at least 1.')
+    if map_evaluate is None:
+        map_evaluate = lambda sales_prices: [evaluate(price) for price in sales_prices]
+
+    ub = sales_price
+    lb = max(lb, 0)
+    num_steps = max(math.ceil((ub - lb) / tolerance), 1)
+    step = (ub - lb) / num_steps
+    low, high = 0, num_steps # price lb + low * step is too low, lb + high * step is good
+
+    first_round = []
+    if ub_guess is not None and math.isfinite(ub_guess):
+        guess_step = math.ceil((ub_guess - lb) / step)
+        if low < guess_step < high:
+            first_round.append(guess_step)
+
+    num_solves = 0
+    num_rounds = 0
+    while high - low > 1:
+        steps = first_round + [low + (high - low) * i // (parallel - len(first_round) + 1)
+                               for i in range(1, parallel - len(first_round) + 1)]
+        steps = sorted(set(i for i in steps if low < i < high))
+        first_round = []
+        with span('sales price round'):
+            results = map_evaluate([lb + i * step for i in steps])
+        num_solves += len(steps)
+        num_rounds += 1
+        for i, (obj_value, num_open_plants) in zip(steps, results):
+            if obj_value > 0 and num_open_plants >= target_open_plants:
+                high = min(high, i)
+            else:
+                low = max(low, i)
+
+    return (math.ceil(lb + high * step) if high < num_steps else math.ceil(ub)), num_solves, num_rounds
@@ -1,7 +1,86 @@
 from unittest import TestCase, TestLoader, TextTestRunner
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from array import array
 from pathlib import Path
+import json
+import os
+import pickle
+import random
+import shutil
+import subprocess
 import sys
+import tempfile
 from sndpgen import SndpGraph, Timer, parse_args_sndp_gen, generate_command
+from sndpgen.command_line import STR_MANIFEST_FILENAME, BackgroundRenderer, read_manifest, file_hash
+from sndpgen.sndp_cache import SndpCache
+from sndpgen.sndp_graph import _Route, _Scenario, visualization_digraph
+from sndpgen.sndp_profile import Profiler, span, report_progress, set_progress_callback, progress_callback
+from sndpgen.sndp_reduction import reduce_scenarios
+from sndpgen.sndp_solver import SOLVERS, search_sales_price
+
+def read_smps(filename):
+    """Minimal reader of the .cor, .tim and .sto files written by SndpGraph.export_smps().
+
+    :return: dict with the keys
+        rows: [(name, sense)] of the constraints, columns: [name], objective: {column: coefficient},
+        matrix: {(row, column): coefficient}, rhs: {row: value}, upper: {column: bound}, integer: {column},
+        periods: [(period, first column, first row)],
+        scenarios: [(probability, period, {row: rhs value})], one per INDEP value or SCENARIOS block
+    """
+    rows, columns, objective, matrix, rhs, upper, integer = [], [], {}, {}, {}, {}, set()
+    section = None
+    integer_section = False
+    for line in Path(filename + '.cor').read_text().splitlines():
+        if not line.startswith(' '):
+            section = line.split()[0]
+            continue
+        fields = line.split()
+        if section == 'ROWS' and fields[0] != 'N':
+            rows.append((fields[1], fields[0]))
+        elif section == 'COLUMNS':
+            if fields[1] == "'MARKER'":
+                integer_section = fields[2] == "'INTORG'"
+                continue
+            if not columns or columns[-1] != fields[0]:
+                columns.append(fields[0])
+            if integer_section:
+                integer.add(fields[0])
+            if fields[1] == 'Profit':
+                objective[fields[0]] = float(fields[2])
+            else:
+                matrix[fields[1], fields[0]] = float(fields[2])
+        elif section == 'RHS':
+            rhs[fields[1]] = float(fields[2])
+        elif section == 'BOUNDS':
+            upper[fields[2]] = float(fields[3])
+
+    periods = []
+    for line in Path(filename + '.tim').read_text().splitlines():
+        if line.startswith(' '): # first column, first row, period
+            fields = line.split()
+            periods.append((fields[2], fields[0], fields[1]))
+
+    scenarios = []
+    sto_format = None
+    for line in Path(filename + '.sto').read_text().splitlines():
+        fields = line.split()
+        if not line.startswith(' '):
+            sto_format = fields[0]
+        elif sto_format == 'INDEP': # RHS row value period probability
+            scenarios.append((float(fields[4]), fields[3], {fields[1]: float(fields[2])}))
+        elif fields[0] == 'SC': # SC name parent probability period
+            scenarios.append((float(fields[3]), fields[4], {}))
+        else:
+            scenarios[-1][2][fields[1]] = float(fields[2])
+    return {'rows': rows, 'columns': columns, 'objective': objective, 'matrix': matrix, 'rhs': rhs, 'upper': upper,
+            'integer': integer, 'periods': periods, 'scenarios': scenarios}
+
+
+def render_visualization_source(visualization_data, format='jpg', to_file=None):
+    """render_visualization() that writes only the dot source, it does not need the dot executable"""
+    return visualization_digraph(visualization_data, format).save(to_file)
+
 
 class TestSndpGraph(TestCase):
 
@@ -25,10 +104,164 @@ class TestSndpGraph(TestCase):
         graph.regenerate_stochastic_data(new_num_scen)
         self.assertEqual(len(graph.get_scenarios()), new_num_scen)
 
+    def test_regenerate_stochastic_data_demand_type(self):
+        graph = SndpGraph('instance_name', 5, 5, 10, 1)
+        min_demand, max_demand = graph._scenario_demand_range()
+        num_scen = int(max_demand - min_demand) + 10
+        with self.assertRaises(ValueError):
+            graph.regenerate_stochastic_data(num_scen)
+        for demand_type in [SndpGraph.STR_DEMAND_REPEATED, SndpGraph.STR_DEMAND_FLOAT]:
+            graph.regenerate_stochastic_data(num_scen, demand_type=demand_type)
+            scenarios = graph.get_scenarios()
+            self.assertEqual(len(scenarios), num_scen)
+            self.assertAlmostEqual(sum(scenario.probability for scenario in scenarios), 1.0)
+            self.assertTrue(all(min_demand <= scenario.demand <= max_demand for scenario in scenarios))
+            # bulk formatted rows are the same as the rows added one by one
+            graph.export_mpl(graph.name)
+            texts = {name: Path(f'{graph.name}_{name}.dat').read_text() for name in ['Prob', 'Demand']}
+            graph._clear_stochastic_data_cache()
+            for scenario in scenarios:
+                graph.add_scenario(scenario)
+            graph.export_mpl(graph.name)
+            for name in ['Prob', 'Demand']:
+                self.assertEqual(texts[name], Path(f'{graph.name}_{name}.dat').read_text())
+        self.assertTrue(all(isinstance(scenario.demand, float) for scenario in scenarios))
+        with self.assertRaises(KeyError):
+            graph.add_scenario(scenarios[0])
+        with self.assertRaises(ValueError):
+            graph.regenerate_stochastic_data(5, demand_type='normal')
+
+    def test_extend_scenarios(self):
+        graph = SndpGraph('instance_name', 5, 5, 3, 1)
+        graph.export_mpl('instance_name_3')
+        demands = [scenario.demand for scenario in graph.get_scenarios()]
+        graph.extend_scenarios(20)
+        graph.extend_scenarios(30)
+        scenarios = graph.get_scenarios()
+        self.assertListEqual([scenario.demand for scenario in scenarios[:3]], demands)
+        self.assertEqual(len(set(scenario.demand for scenario in scenarios)), 30)
+        self.assertAlmostEqual(sum(scenario.probability for scenario in scenarios), 1.0)
+        # Demand.dat is the copy of instance_name_3_Demand.dat with the appended rows, the same as the full export
+        graph.export_mpl('instance_name_30')
+        SndpGraph.from_dat('instance_name_30').export_mpl('instance_name_parsed')
+        for data_item_name in ['Prob', 'Demand', 'ScalarData']:
+            self.assertEqual(Path(f'instance_name_30_{data_item_name}.dat').read_text(),
+                             Path(f'instance_name_parsed_{data_item_name}.dat').read_text())
+        self.assertEqual(len(Path('instance_name_3_Demand.dat').read_text().splitlines()), 2 + 3)
+        with self.assertRaises(ValueError):
+            graph.extend_scenarios(10)
+
+    def test_extend_scenarios_mixed_demand_type(self):
+        for demand_type, new_demand_type in [(SndpGraph.STR_DEMAND_FLOAT, SndpGraph.STR_DEMAND_UNIQUE),
+                                             (SndpGraph.STR_DEMAND_UNIQUE, SndpGraph.STR_DEMAND_FLOAT)]:
+            graph = SndpGraph('instance_name', 5, 5, 1, 1)
+            graph.regenerate_stochastic_data(5, demand_type=demand_type)
+            graph.export_mpl('instance_name_5')
+            demands = [scenario.demand for scenario in graph.get_scenarios()]
+            graph.extend_scenarios(8, demand_type=new_demand_type)
+            scenarios = graph.get_scenarios()
+            self.assertEqual(len(scenarios), 8)
+            self.assertListEqual([scenario.demand for scenario in scenarios[:5]], demands)
+            self.assertTrue(all(isinstance(scenario.demand, float) for scenario in scenarios))
+            # the exported rows are the ones of the full export
+            graph.export_mpl('instance_name_8')
+            SndpGraph.from_dat('instance_name_8').export_mpl('instance_name_parsed')
+            for data_item_name in ['Prob', 'Demand']:
+                self.assertEqual(Path(f'instance_name_8_{data_item_name}.dat').read_text(),
+                                 Path(f'instance_name_parsed_{data_item_name}.dat').read_text())
+
+    def test_export_reduced_mpl(self):
+        graph = SndpGraph('instance_name', 5, 5, 200, 1)
+        data = graph.data_as_dict
+        graph.export_mpl(graph.name)
+        graph.export_reduced_mpl('instance_name_reduced', 10)
+        self.assertDictEqual(data, graph.data_as_dict)
+        reduced_graph = SndpGraph.from_dat('instance_name_reduced')
+        reduced_scenarios = reduced_graph.get_scenarios()
+        self.assertEqual(len(reduced_scenarios), 10)
+        self.assertAlmostEqual(sum(scenario.probability for scenario in reduced_scenarios), 1.0)
+        demands = {scenario.demand for scenario in graph.get_scenarios()}
+        self.assertTrue(all(scenario.demand in demands for scenario in reduced_scenarios))
+        # the core .dat files are shared, the full instance is still actual
+        self.assertIn(f'{graph.name}_ShipCost.dat', Path('instance_name_reduced.mpl').read_text())
+        graph.export_mpl('instance_name_full')
+        self.assertIn(f'{graph.name}_Demand.dat', Path('instance_name_full.mpl').read_text())
+
+    def test_materials_delivered(self):
+        graph = SndpGraph('instance_name', 60, 20, 1, 4)
+        materials = set(graph.get_materials())
+        for plant in graph.get_end_product_plants():
+            available_materials = set(plant.get_products())
+            for route in plant.get_inbounds():
+                available_materials.update(route.start.get_products())
+            self.assertLessEqual(materials, available_materials)
+        plant = next(iter(graph.get_end_product_plants()))
+        with self.assertRaises(KeyError):
+            plant.add_product(graph.get_end_product())
+        with self.assertRaises(KeyError):
+            graph.get_end_product().add_plant(plant)
+
+    def test_accessor_views(self):
+        graph = SndpGraph('instance_name', 10, 5, 3, 2)
+        self.assertIs(graph.get_locations(), graph.get_locations())
+        self.assertIs(graph.get_end_location(), graph.get_locations()[-1])
+        self.assertEqual(graph.get_materials(), graph.get_products()[:-1])
+        routes = graph.get_routes()
+        self.assertIs(routes, graph.get_routes())
+        end_product_plant = next(iter(graph.get_end_product_plants()))
+        plant = next(plant for plant in graph.get_plants() if plant is not end_product_plant and
+                     graph.get_route(plant, end_product_plant) is None and graph.get_route(end_product_plant, plant) is None)
+        inbounds = end_product_plant.get_inbounds()
+        # views are updated after the changes
+        graph.add_route(_Route(plant, end_product_plant, 1))
+        self.assertEqual(len(graph.get_routes()), len(routes) + 1)
+        self.assertEqual(len(end_product_plant.get_inbounds()), len(inbounds) + 1)
+        scenarios = graph.get_scenarios()
+        self.assertIs(scenarios, graph.get_scenarios())
+        graph.add_scenario(_Scenario(4, 0.0, 1))
+        self.assertEqual(len(graph.get_scenarios()), 4)
+        graph.regenerate_stochastic_data(2)
+        self.assertEqual(len(graph.get_scenarios()), 2)
+
+    def test_random_generator_per_graph(self):
+        # interleaved calls of two graphs and draws from the global random module
+        graphs = [SndpGraph('instance_name', 20, 5, 10, seed) for seed in [1, 2]]
+        random.seed(0)
+        for num_scen in [7, 10, 7]:
+            for graph in graphs:
+                graph.regenerate_stochastic_data(num_scen)
+                random.random()
+        # the same calls one graph after another
+        for seed, graph in zip([1, 2], graphs):
+            separate_graph = SndpGraph('instance_name', 20, 5, 10, seed)
+            for num_scen in [7, 10, 7]:
+                separate_graph.regenerate_stochastic_data(num_scen)
+            self.assertDictEqual(graph.data_as_dict, separate_graph.data_as_dict)
+
+    def test_threads(self):
+        seeds = list(range(6))
+        expected = [SndpGraph('instance_name', 30, 5, 20, seed).data_as_dict for seed in seeds]
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            data = list(executor.map(lambda seed: SndpGraph('instance_name', 30, 5, 20, seed).data_as_dict, seeds))
+        for expected_data, thread_data in zip(expected, data):
+            self.assertDictEqual(expected_data, thread_data)
+
     def test_visualize(self):
         graph = SndpGraph('instance_name', 20, 5, 20, 1)
         graph.visualize()
 
+    def test_visualization_data(self):
+        try:
+            import graphviz
+        except ImportError:
+            self.skipTest('graphviz is not installed')
+        graph = SndpGraph('instance_name', 20, 5, 20, 1)
+        visualization_data = graph.visualization_data()
+        self.assertEqual(len(visualization_data['nodes']), len(graph.get_locations()))
+        self.assertEqual(len(visualization_data['edges']), len(graph.get_routes()))
+        graph.visualize(to_file=str(Path(tempfile.mkdtemp()) / 'instance_name'))
+        self.assertEqual(visualization_digraph(visualization_data).source, graph.dot_graph.source)
+
     def test_data_as_dict(self):
         num_locations = 5
         num_products = 3
@@ -41,7 +274,249 @@ class TestSndpGraph(TestCase):
         # data below might change if we modify the class variables of SndpGraph
         self.assertListEqual(data['MaterialReq'], [{'material': 1, 'value': 2}, {'material': 2, 'value': 3}])
         self.assertListEqual(data['Prob'], [{'SCEN': 1, 'value': 0.5}, {'SCEN': 2, 'value': 0.5}])
-        self.assertListEqual(data['Demand'], [{'SCEN': 1, 'value': 5673}, {'SCEN': 2, 'value': 7295}])
+        self.assertListEqual(data['Demand'], [{'SCEN': 1, 'value': 7485}, {'SCEN': 2, 'value': 5146}])
+
+    def test_init_multiprocessing(self):
+        min_multithread_location_limit = SndpGraph.INT_MIN_MULTITHREAD_LOCATION_LIMIT
+        SndpGraph.INT_MIN_MULTITHREAD_LOCATION_LIMIT = 2
+        try:
+            data = [SndpGraph('instance_name', 60, 6, 5, 3, num_cpu=num_cpu).data_as_dict for num_cpu in [1, 2, 3, 4]]
+        finally:
+            SndpGraph.INT_MIN_MULTITHREAD_LOCATION_LIMIT = min_multithread_location_limit
+        # generated data does not depend on the number of processes
+        self.assertDictEqual(data[0], data[1])
+        self.assertDictEqual(data[0], data[2])
+        self.assertDictEqual(data[0], data[3])
+        self.assertEqual(data[0]['NrOfLocations'], 60)
+        # every route has its arc
+        arcs = {(arc['start'], arc['finish']) for arc in data[0]['arc']}
+        for ship_cost in data[0]['ShipCost']:
+            self.assertIn((ship_cost['start'], ship_cost['finish']), arcs)
+
+    def test_compact(self):
+        graph = SndpGraph('instance_name', 10, 5, 3, 2)
+        compact_graph = SndpGraph('instance_name_compact', 10, 5, 3, 2, compact=True)
+        self.assertDictEqual(graph.data_as_dict, compact_graph.data_as_dict)
+        graph.export_mpl(graph.name)
+        compact_graph.export_mpl(compact_graph.name)
+        for data_item_name in ['ShipCost', 'ArcProduct', 'arc', 'Prob', 'Demand', 'MaterialReq']:
+            self.assertEqual(Path(f'{graph.name}_{data_item_name}.dat').read_text(),
+                             Path(f'{compact_graph.name}_{data_item_name}.dat').read_text())
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = SndpCache(directory)
+            graph = SndpGraph('instance_name', 10, 5, 3, 2)
+            generated_graph = SndpGraph('instance_name_generated', 10, 5, 3, 2, cache=cache)
+            cached_graph = SndpGraph('instance_name_cached', 10, 5, 3, 2, cache=cache)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            # the same core data and the same random state after it, thus, the same stochastic data
+            self.assertDictEqual(graph.data_as_dict, cached_graph.data_as_dict)
+            self.assertDictEqual(generated_graph.data_as_dict, cached_graph.data_as_dict)
+            graph.export_mpl(graph.name)
+            cached_graph.export_mpl(cached_graph.name)
+            for data_item_name in ['ShipCost', 'ArcProduct', 'arc', 'Prob', 'Demand', 'MaterialReq']:
+                self.assertEqual(Path(f'{graph.name}_{data_item_name}.dat').read_text(),
+                                 Path(f'{cached_graph.name}_{data_item_name}.dat').read_text())
+            # the key includes the parameters of the generation
+            SndpGraph('instance_name', 10, 5, 3, 3, cache=cache)
+            self.assertEqual(cache.misses, 2)
+            # not reproducible without the seed
+            SndpGraph('instance_name', 10, 5, 3, cache=cache)
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_cache_eviction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = SndpCache(directory, max_size=1) # only the newest entry is kept
+            for key in ['a', 'b', 'c']:
+                cache.store(key, {'key': key}, {'values': array('i', [1, 2, 3])})
+            self.assertEqual(len(list(Path(directory).iterdir())), 1)
+            self.assertIsNone(cache.load('a'))
+            header, arrays = cache.load('c')
+            self.assertEqual(header['key'], 'c')
+            self.assertEqual(list(arrays['values']), [1, 2, 3])
+
+    def test_cache_broken_entry(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = SndpCache(directory)
+            SndpGraph('instance_name', 10, 5, 3, 2, cache=cache)
+            entry = next(Path(directory).glob('*' + SndpCache.STR_SUFFIX))
+            # entries are not unpickled: a pickle that would run code is a broken entry, removed and generated again
+            class Payload():
+                def __reduce__(self):
+                    return (Path(directory, 'unpickled').touch, ())
+            entry.write_bytes(pickle.dumps(Payload()))
+            graph = SndpGraph('instance_name', 10, 5, 3, 2, cache=cache)
+            self.assertFalse(Path(directory, 'unpickled').exists())
+            self.assertEqual((cache.hits, cache.misses), (0, 2))
+            # truncated entry
+            entry.write_bytes(entry.read_bytes()[:-8])
+            self.assertDictEqual(SndpGraph('instance_name', 10, 5, 3, 2, cache=cache).data_as_dict, graph.data_as_dict)
+            self.assertEqual(cache.misses, 3)
+
+    def test_save_load(self):
+        graph = SndpGraph('instance_name', 10, 5, 30, 2)
+        graph.sales_price = 97
+        graph.save('instance_name.sndp')
+        header, arrays = SndpGraph.read_snapshot('instance_name.sndp')
+        self.assertEqual(header['num_locations'], 10)
+        self.assertListEqual(list(arrays['demands']), [scenario.demand for scenario in graph.get_scenarios()])
+        graph.regenerate_stochastic_data(7)
+        graph.export_mpl(graph.name)
+        for compact in [False, True]:
+            loaded_graph = SndpGraph.load('instance_name.sndp', compact=compact)
+            self.assertEqual(loaded_graph.sales_price, 97)
+            self.assertEqual(len(loaded_graph.get_scenarios()), 30)
+            # the random state is restored
+            loaded_graph.regenerate_stochastic_data(7)
+            self.assertDictEqual(graph.data_as_dict, loaded_graph.data_as_dict)
+            loaded_graph.export_mpl('instance_name_loaded')
+            for data_item_name in ['ShipCost', 'ArcProduct', 'arc', 'Prob', 'Demand', 'MaterialReq', 'ScalarData']:
+                self.assertEqual(Path(f'{graph.name}_{data_item_name}.dat').read_text(),
+                                 Path(f'instance_name_loaded_{data_item_name}.dat').read_text())
+        Path('instance_name_wrong.sndp').write_bytes(b'0' * 100)
+        with self.assertRaises(ValueError):
+            SndpGraph.load('instance_name_wrong.sndp')
+
+    def test_from_dat(self):
+        graph = SndpGraph('instance_name', 10, 5, 30, 2)
+        graph.export_mpl(graph.name)
+        for compact in [False, True]:
+            parsed_graph = SndpGraph.from_dat(graph.name, compact=compact)
+            self.assertDictEqual(graph.data_as_dict, parsed_graph.data_as_dict)
+            self.assertListEqual([plant.id for plant in graph.get_end_product_plants()],
+                                 [plant.id for plant in parsed_graph.get_end_product_plants()])
+            parsed_graph.export_mpl('instance_name_parsed')
+            for data_item_name in ['ShipCost', 'ArcProduct', 'arc', 'Prob', 'Demand', 'MaterialReq', 'ScalarData']:
+                self.assertEqual(Path(f'{graph.name}_{data_item_name}.dat').read_text(),
+                                 Path(f'instance_name_parsed_{data_item_name}.dat').read_text())
+        # published instance
+        parsed_graph = SndpGraph.from_dat('10_5_0_1')
+        self.assertEqual(parsed_graph.data_as_dict['NrOfLocations'], 10)
+        self.assertEqual(parsed_graph.data_as_dict['NrOfScen'], 1)
+        parsed_graph.export_mpl('instance_name_parsed')
+        for data_item_name in ['ShipCost', 'ArcProduct', 'arc', 'Prob', 'Demand', 'MaterialReq']:
+            self.assertListEqual(Path(f'10_5_0_1_{data_item_name}.dat').read_text().split(),
+                                 Path(f'instance_name_parsed_{data_item_name}.dat').read_text().split())
+        # shares the unchanged .dat files with graph
+        graph.regenerate_stochastic_data(3)
+        graph.export_mpl('instance_name_3')
+        self.assertDictEqual(graph.data_as_dict, SndpGraph.from_dat('instance_name_3').data_as_dict)
+        SndpGraph('instance_name_wrong', 5, 3, 2, 1).export_mpl('instance_name_wrong')
+        Path('instance_name_wrong_ArcProduct.dat').write_text('!arc\n!start,finish\n1,2\n')
+        with self.assertRaises(ValueError):
+            SndpGraph.from_dat('instance_name_wrong')
+
+    def test_export_mpl_streaming(self):
+        export_chunk_rows = SndpGraph.INT_EXPORT_CHUNK_ROWS
+        SndpGraph.INT_EXPORT_CHUNK_ROWS = 7 # several chunks per file
+        try:
+            graph = SndpGraph('instance_name', 10, 5, 30, 2)
+            graph.export_mpl(graph.name)
+            streaming_graph = SndpGraph('instance_name_streaming', 10, 5, 30, 2)
+            streaming_graph.export_mpl(streaming_graph.name, streaming=True)
+        finally:
+            SndpGraph.INT_EXPORT_CHUNK_ROWS = export_chunk_rows
+        for data_item_name in ['ShipCost', 'ArcProduct', 'arc', 'Prob', 'Demand', 'MaterialReq']:
+            self.assertEqual(Path(f'{graph.name}_{data_item_name}.dat').read_text(),
+                             Path(f'{streaming_graph.name}_{data_item_name}.dat').read_text())
+
+    def test_export_smps(self):
+        num_scen = 4
+        graph = SndpGraph('instance_name', 10, 5, num_scen, 2)
+        graph.export_smps(graph.name)
+        core = Path(f'{graph.name}.cor').read_text()
+        num_plants = len(graph.get_end_product_plants())
+        num_rows = 1 + num_plants * len(graph.get_materials()) + 1 + num_plants # PlantLimit, BOMConstr, DemConstr, PlantConstr
+        self.assertEqual(core.count('\n E  ') + core.count('\n L  '), num_rows)
+        self.assertEqual(core.count(' UP BND '), num_plants)
+        for arc_product in graph.data_as_dict['ArcProduct']:
+            self.assertIn('Ship[{},{},{}]    Profit'.format(arc_product['product'], arc_product['start'], arc_product['finish']), core)
+        self.assertIn('STAGE2', Path(f'{graph.name}.tim').read_text())
+        sto = Path(f'{graph.name}.sto').read_text()
+        self.assertEqual(sto.count('RHS       DemConstr'), num_scen)
+        # core is not changed by the scenarios
+        graph.regenerate_stochastic_data(2)
+        graph.export_smps(f'{graph.name}_2', sto_format='SCENARIOS')
+        self.assertEqual(Path(f'{graph.name}_2.cor').read_text(), core)
+        self.assertEqual(Path(f'{graph.name}_2.sto').read_text().count(' SC SCEN'), 2)
+
+    def test_export_smps_read(self):
+        num_scen = 3
+        graph = SndpGraph('instance_name', 10, 5, num_scen, 2)
+        extensive_form = graph.extensive_form()
+        num_first_stage_cols = extensive_form.num_first_stage_cols
+        demands = [demand['value'] for demand in graph.data_as_dict['Demand']]
+        probabilities = [prob['value'] for prob in graph.data_as_dict['Prob']]
+        for sto_format in ['INDEP', 'SCENARIOS']:
+            graph.export_smps(f'{graph.name}_{sto_format}', sto_format=sto_format)
+            smps = read_smps(f'{graph.name}_{sto_format}')
+            columns = smps['columns']
+            row_names = [name for name, _ in smps['rows']]
+
+            # periods split the columns and rows into the stages
+            self.assertListEqual([period for period, _, _ in smps['periods']], ['STAGE1', 'STAGE2'])
+            (_, first_column_1, first_row_1), (_, first_column_2, first_row_2) = smps['periods']
+            self.assertEqual(columns.index(first_column_1), 0)
+            self.assertEqual(row_names.index(first_row_1), 0)
+            self.assertEqual(columns.index(first_column_2), num_first_stage_cols)
+            first_stage_rows = row_names[:row_names.index(first_row_2)]
+            second_stage_rows = row_names[row_names.index(first_row_2):]
+            first_stage_columns = columns[:num_first_stage_cols]
+            for (row, column) in smps['matrix']:
+                if row in first_stage_rows:
+                    self.assertIn(column, first_stage_columns)
+            self.assertSetEqual(smps['integer'], set(first_stage_columns))
+
+            # scenarios
+            self.assertEqual(len(smps['scenarios']), num_scen)
+            self.assertAlmostEqual(sum(probability for probability, _, _ in smps['scenarios']), 1)
+            for scenario, (probability, period, scenario_rhs) in enumerate(smps['scenarios']):
+                self.assertEqual(period, 'STAGE2')
+                self.assertAlmostEqual(probability, probabilities[scenario])
+                self.assertDictEqual(scenario_rhs, {'DemConstr': demands[scenario]})
+
+                # second stage of the scenario is the one of the extensive form
+                rhs = dict(smps['rhs'], **scenario_rhs)
+                for i, (row, sense) in enumerate(smps['rows'][len(first_stage_rows):]):
+                    ef_row = scenario * len(second_stage_rows) + i
+                    self.assertEqual(extensive_form.row_name(ef_row), f'{row}_SCEN{scenario + 1}')
+                    self.assertEqual(extensive_form.row_upper[ef_row], rhs.get(row, 0))
+                    self.assertEqual(extensive_form.row_lower[ef_row] == extensive_form.row_upper[ef_row], sense == 'E')
+                    entries = {extensive_form.col_name(col).replace(f'_SCEN{scenario + 1}', ''): coefficient
+                               for col, coefficient in zip(extensive_form.indices[extensive_form.indptr[ef_row]:extensive_form.indptr[ef_row + 1]],
+                                                           extensive_form.data[extensive_form.indptr[ef_row]:extensive_form.indptr[ef_row + 1]])}
+                    self.assertDictEqual(entries, {column: coefficient for (matrix_row, column), coefficient in smps['matrix'].items()
+                                                   if matrix_row == row})
+                for col, column in enumerate(columns[num_first_stage_cols:]):
+                    ef_col = num_first_stage_cols + scenario * (len(columns) - num_first_stage_cols) + col
+                    self.assertAlmostEqual(extensive_form.objective[ef_col], probability * smps['objective'].get(column, 0))
+            for col, column in enumerate(first_stage_columns):
+                self.assertEqual(extensive_form.col_name(col), column)
+                self.assertEqual(extensive_form.objective[col], smps['objective'][column])
+                self.assertEqual(extensive_form.col_upper[col], smps['upper'][column])
+
+    def test_extensive_form(self):
+        num_scen = 3
+        graph = SndpGraph('instance_name', 10, 5, num_scen, 2)
+        extensive_form = graph.extensive_form()
+        num_plants = len(graph.get_end_product_plants())
+        num_ship = len(graph.data_as_dict['ArcProduct'])
+        num_core_rows = num_plants * len(graph.get_materials()) + 1 + num_plants  # BOMConstr, DemConstr, PlantConstr
+        self.assertEqual(extensive_form.num_first_stage_cols, num_plants)
+        self.assertEqual(extensive_form.num_cols, num_plants + num_scen * num_ship)
+        self.assertEqual(extensive_form.num_rows, num_scen * num_core_rows)
+        self.assertEqual(len(extensive_form.indptr), extensive_form.num_rows + 1)
+        self.assertEqual(extensive_form.indptr[-1], extensive_form.nnz)
+        self.assertEqual(sum(extensive_form.integrality), num_plants)
+        demands = [demand['value'] for demand in graph.data_as_dict['Demand']]
+        self.assertListEqual([value for value in extensive_form.row_upper if value > 0], demands)
+        self.assertEqual(extensive_form.row_name(num_core_rows - 1 - num_plants), 'DemConstr_SCEN1')
+        try:
+            import scipy
+        except ImportError:
+            return
+        self.assertEqual(extensive_form.to_scipy().shape, (extensive_form.num_rows, extensive_form.num_cols))
 
     def test_adjust_sales_price(self):
         num_locations = 10
@@ -52,12 +527,198 @@ class TestSndpGraph(TestCase):
         graph.adjust_sales_price()
         self.assertLessEqual(graph.sales_price, init_sales_price)
 
+    def test_adjust_sales_price_solvers(self):
+        sales_prices = []
+        for name, solver_class in SOLVERS.items():
+            if not solver_class.is_available():
+                continue
+            graph = SndpGraph('instance_name', 10, 5, 3, 2)
+            graph.adjust_sales_price(solver=name)
+            sales_prices.append(graph.sales_price)
+        if not sales_prices:
+            self.skipTest('No open-source MILP solver is installed')
+        self.assertLessEqual(max(sales_prices), SndpGraph.FLOAT_INIT_SALES_PRICE)
+        self.assertEqual(len(set(sales_prices)), 1)
+        graph = SndpGraph('instance_name', 10, 5, 3, 2)
+        graph.adjust_sales_price(parallel=3)
+        self.assertEqual(graph.sales_price, sales_prices[0])
+        lb, ub_guess = graph.sales_price_bracket()
+        self.assertLessEqual(lb, ub_guess)
+        self.assertGreaterEqual(graph.sales_price, lb)
+
+    def test_sales_price_bracket_missing_material(self):
+        graph = SndpGraph('instance_name', 10, 5, 3, 2)
+        # the first end product plant does not get the first material
+        plant_id = next(iter(graph.get_end_product_plants())).id
+        material_id = graph.get_materials()[0].id
+        arc_products = graph._data['ArcProduct']
+        for key, (product_id, start_id, finish_id, _) in list(arc_products.items()):
+            if product_id == material_id and finish_id == plant_id:
+                del arc_products[key]
+        lb, ub_guess = graph.sales_price_bracket()
+        self.assertLessEqual(lb, ub_guess)
+        self.assertLess(ub_guess, float('inf'))
+
+    def test_solver_not_solved(self):
+        for name, solver_class in SOLVERS.items():
+            if not solver_class.is_available():
+                continue
+            extensive_form = SndpGraph('instance_name', 10, 5, 3, 2).extensive_form()
+            # demand that exceeds the capacity of all the plants has to be met: infeasible
+            for row in range(extensive_form.num_rows):
+                if extensive_form.row_name(row).startswith('DemConstr'):
+                    extensive_form.row_lower[row] = 1e9
+            with self.assertRaises(RuntimeError):
+                solver_class(extensive_form).evaluate(SndpGraph.FLOAT_INIT_SALES_PRICE)
+
     @classmethod
     def tearDownClass(cls):
         for file in Path().glob("instance_name*"):
             file.unlink()
 
 
+class TestSearchSalesPrice(TestCase):
+
+    def test_search_sales_price(self):
+        # objective is positive and all plants are open from sales price 37
+        evaluate = lambda sales_price: (sales_price - 37, 3 if sales_price >= 37 else 2)
+        sales_price, _, _ = search_sales_price(evaluate, 120, 3)
+        self.assertGreaterEqual(sales_price, 37)
+        self.assertLessEqual(sales_price, 37 + 5 + 1)
+
+    def test_search_sales_price_bracket(self):
+        solves = []
+        def evaluate(sales_price):
+            solves.append(sales_price)
+            return sales_price - 37, 3 if sales_price >= 37 else 2
+        search_sales_price(evaluate, 120, 3)
+        full_bracket_solves = len(solves)
+        # good guess shrinks the bracket, bad guess costs at most one solve more
+        for ub_guess, max_solves in [(50, full_bracket_solves - 1), (30, full_bracket_solves + 1)]:
+            solves.clear()
+            sales_price, num_solves, num_rounds = search_sales_price(evaluate, 120, 3, lb=20, ub_guess=ub_guess)
+            self.assertGreaterEqual(sales_price, 37)
+            self.assertLessEqual(sales_price, 37 + 5 + 1)
+            self.assertLessEqual(len(solves), max_solves)
+            self.assertEqual(num_solves, len(solves))
+            self.assertEqual(num_rounds, len(solves)) # one solve per round without parallel
+
+    def test_search_sales_price_infinite_guess(self):
+        evaluate = lambda sales_price: (sales_price - 37, 3 if sales_price >= 37 else 2)
+        self.assertEqual(search_sales_price(evaluate, 120, 3, lb=20, ub_guess=float('inf')),
+                         search_sales_price(evaluate, 120, 3, lb=20))
+
+    def test_search_sales_price_profile(self):
+        evaluate = lambda sales_price: (sales_price - 37, 3 if sales_price >= 37 else 2)
+        with Profiler() as profiler:
+            _, _, num_rounds = search_sales_price(evaluate, 120, 3)
+        self.assertEqual(profiler.root.children['sales price round'].calls, num_rounds)
+
+    def test_search_sales_price_parallel(self):
+        for threshold in [0.5, 37, 61.2, 119]:
+            evaluate = lambda sales_price: (sales_price - threshold, 3 if sales_price >= threshold else 2)
+            serial, _, serial_rounds = search_sales_price(evaluate, 120, 3, lb=0.2, ub_guess=45)
+            for parallel in [2, 3, 7]:
+                sales_price, _, num_rounds = search_sales_price(evaluate, 120, 3, lb=0.2, ub_guess=45, parallel=parallel)
+                self.assertEqual(sales_price, serial)
+                self.assertLessEqual(num_rounds, serial_rounds)
+
+
+class TestReduceScenarios(TestCase):
+
+    def test_reduce_scenarios(self):
+        probabilities, demands = reduce_scenarios([0.1, 0.1, 0.1, 0.3, 0.4], [10, 31, 11, 30, 12], 2)
+        self.assertEqual(list(demands), [11, 30])
+        self.assertAlmostEqual(probabilities[0], 0.6)
+        self.assertAlmostEqual(probabilities[1], 0.4)
+        # equal demands are never split
+        probabilities, demands = reduce_scenarios([0.25] * 4, [5, 5, 5, 7], 3)
+        self.assertEqual(list(demands), [5, 7])
+        self.assertEqual(list(probabilities), [0.75, 0.25])
+        probabilities, demands = reduce_scenarios([0.5, 0.5], [1.5, 2.5], 1)
+        self.assertEqual((list(probabilities), list(demands)), ([1.0], [1.5]))
+        with self.assertRaises(ValueError):
+            reduce_scenarios([1.0], [1, 2], 1)
+
+    def test_reduce_scenarios_k_means(self):
+        # two groups of demands are found from the initial clusters of equal probability
+        demands = [900 + i for i in range(21)] + [100 + i for i in range(11)]
+        probabilities, reduced_demands = reduce_scenarios([1 / len(demands)] * len(demands), demands, 2)
+        self.assertEqual(list(reduced_demands), [105, 910])
+        self.assertEqual([round(probability * len(demands)) for probability in probabilities], [11, 21])
+
+
+class TestProfiler(TestCase):
+
+    def test_spans(self):
+        with Profiler(trace_memory=True) as profiler:
+            with span('outer'):
+                for _ in range(2):
+                    with span('inner'):
+                        data = list(range(100000))
+                        del data
+            graph = SndpGraph('instance_name', 5, 5, 10, 1)
+        with span('outside'):
+            pass
+        report = profiler.report()
+        self.assertEqual([child['name'] for child in report['spans']['children']], ['outer', 'core data', 'stochastic data'])
+        outer = report['spans']['children'][0]
+        inner = outer['children'][0]
+        self.assertEqual((outer['calls'], inner['calls']), (1, 2))
+        self.assertGreaterEqual(outer['wall'], inner['wall'])
+        self.assertGreater(inner['memory_peak'], 100000 * 8)
+        self.assertGreaterEqual(outer['memory_peak'], inner['memory_peak'])
+        self.assertGreaterEqual(report['spans']['memory_peak'], outer['memory_peak'])
+        self.assertIn('plants', [child['name'] for child in report['spans']['children'][1]['children']])
+        # reports of the worker processes are summed up
+        with Profiler() as total:
+            with span('outer'):
+                total.merge(report)
+            total.merge(report)
+        self.assertEqual(total.root.children['outer'].children['outer'].children['inner'].calls, 2)
+        self.assertEqual(total.root.children['outer'].calls, 2)
+
+    def test_progress_callback(self):
+        calls = []
+        previous = set_progress_callback(lambda task, current, total: calls.append((task, current)), 3600)
+        self.assertIsNone(previous[0]) # the library reports no progress unless a callback is set, e.g., by sndp_gen
+        try:
+            for current in range(1, 11):
+                report_progress('task', current, 10)
+            for current in range(1, 3):
+                report_progress('other task', current, 2)
+        finally:
+            set_progress_callback(*previous)
+        self.assertEqual(calls, [('task', 1), ('task', 10), ('other task', 1), ('other task', 2)])
+        calls.clear()
+        with progress_callback(lambda task, current, total: calls.append((task, current))):
+            report_progress('task', 1, 1)
+        report_progress('task', 1, 1)
+        self.assertEqual(calls, [('task', 1)])
+
+    def test_timer_deprecated(self):
+        with self.assertWarns(DeprecationWarning):
+            Timer('test_timer_deprecated')
+
+
+class TestImport(TestCase):
+
+    INT_IMPORT_TIME_BUDGET = 200000 # us, cumulative import time of sndpgen reported by python -X importtime
+
+    def test_import_time(self):
+        # the optional and heavy dependencies are imported only when they are used
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import sndpgen'], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parents[1], check=True)
+        imports = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line and 'cumulative' not in line:
+                _, cumulative, module = line.split('|')
+                imports[module.strip()] = int(cumulative)
+        for module in ['graphviz', 'yaml', 'pkg_resources', 'multiprocessing', 'concurrent.futures', 'sndpgen.sndp_model']:
+            self.assertNotIn(module, imports)
+        self.assertLess(imports['sndpgen'], self.INT_IMPORT_TIME_BUDGET)
+
+
 class TestCommandLineSndpGen(TestCase):
 
     @classmethod
@@ -72,14 +733,182 @@ class TestCommandLineSndpGen(TestCase):
     def test_parse_args_default_yaml(self):
         parsed = parse_args_sndp_gen([])
         self.assertEqual(parsed.yaml, 'param.yaml')
+        self.assertEqual(parsed.jobs, 1)
+        self.assertFalse(parsed.smps)
+        self.assertFalse(parsed.no_cache)
+        self.assertFalse(parsed.force)
+
+    def test_command_jobs(self):
+        argv = sys.argv
+        try:
+            sys.argv = argv[:1] + ['--yaml', 'param.yaml']
+            self.assertTrue(generate_command())
+            serial_files = {file.name: file.read_bytes() for file in Path().glob("SNDP_*.*")}
+            for file in Path().glob("SNDP_*"):
+                file.unlink()
+            sys.argv = argv[:1] + ['--yaml', 'param.yaml', '--jobs', '2']
+            self.assertTrue(generate_command())
+            parallel_files = {file.name: file.read_bytes() for file in Path().glob("SNDP_*.*")}
+            self.assertDictEqual(serial_files, parallel_files)
+            for file in Path().glob("SNDP_*"):
+                file.unlink()
+            sys.argv = argv[:1] + ['--yaml', 'param.yaml', '--no-cache']
+            self.assertTrue(generate_command())
+            no_cache_files = {file.name: file.read_bytes() for file in Path().glob("SNDP_*.*")}
+            self.assertDictEqual(serial_files, no_cache_files)
+        finally:
+            sys.argv = argv
+
+    @patch('sndpgen.command_line.render_visualization', render_visualization_source)
+    def test_command_manifest(self):
+        argv = sys.argv
+        try:
+            sys.argv = argv[:1] + ['--yaml', 'param.yaml']
+            self.assertTrue(generate_command())
+            files = {file.name: (file.read_bytes(), file.stat().st_mtime_ns) for file in Path().glob("SNDP_*")}
+            # nothing changed, nothing is written and no file is hashed
+            with patch('sndpgen.command_line.file_hash', wraps=file_hash) as hashed:
+                self.assertTrue(generate_command())
+            self.assertEqual(hashed.call_count, 0)
+            self.assertDictEqual(files, {file.name: (file.read_bytes(), file.stat().st_mtime_ns) for file in Path().glob("SNDP_*")})
+            # touched file is hashed, it is not changed
+            touched_file = Path('SNDP_5_3_0_1_Demand.dat')
+            os.utime(touched_file, ns=(files[touched_file.name][1] + 10**9,) * 2)
+            with patch('sndpgen.command_line.file_hash', wraps=file_hash) as hashed:
+                self.assertTrue(generate_command())
+            self.assertEqual(hashed.call_count, 1)
+            self.assertEqual(touched_file.stat().st_mtime_ns, files[touched_file.name][1] + 10**9)
+            with patch('sndpgen.command_line.file_hash', wraps=file_hash) as hashed:
+                self.assertTrue(generate_command())
+            self.assertEqual(hashed.call_count, 0)
+            # changed file is generated again
+            changed_file = Path('SNDP_5_3_0_25_Demand.dat')
+            changed_file.write_text('changed')
+            self.assertTrue(generate_command())
+            self.assertEqual(changed_file.read_bytes(), files[changed_file.name][0])
+            self.assertEqual(Path('SNDP_5_3_1_25_Demand.dat').stat().st_mtime_ns, files['SNDP_5_3_1_25_Demand.dat'][1])
+            # --force generates everything
+            sys.argv = argv[:1] + ['--yaml', 'param.yaml', '--force']
+            self.assertTrue(generate_command())
+            self.assertNotEqual(Path('SNDP_5_3_1_25_Demand.dat').stat().st_mtime_ns, files['SNDP_5_3_1_25_Demand.dat'][1])
+        finally:
+            sys.argv = argv
+
+    def test_command_nested_scenarios(self):
+        argv = sys.argv
+        yaml_file = Path('param_nested.yaml')
+        try:
+            yaml_file.write_text(Path('param.yaml').read_text() + '\nnested_scenarios: true\n')
+            sys.argv = argv[:1] + ['--yaml', str(yaml_file)]
+            self.assertTrue(generate_command())
+            first_rows = Path('SNDP_5_3_0_1_Demand.dat').read_text()
+            self.assertTrue(Path('SNDP_5_3_0_25_Demand.dat').read_text().startswith(first_rows))
+        finally:
+            sys.argv = argv
+            yaml_file.unlink(missing_ok=True)
+
+    def test_command_profile(self):
+        argv = sys.argv
+        profile_file = Path('profile.json')
+        try:
+            for jobs in ['1', '2']:
+                sys.argv = argv[:1] + ['--yaml', 'param.yaml', '--force', '--jobs', jobs, '--profile', str(profile_file)]
+                self.assertTrue(generate_command())
+                report = json.loads(profile_file.read_text())
+                self.assertEqual(report['jobs'], int(jobs))
+                generate = {child['name']: child for child in report['spans']['children']}['generate_instances']
+                self.assertEqual(generate['calls'], report['num_generated'])
+                self.assertEqual({child['name'] for child in generate['children']},
+                                 {'core data', 'adjust_sales_price', 'visualization_data', 'stochastic data', 'export_mpl'})
+        finally:
+            sys.argv = argv
+            profile_file.unlink(missing_ok=True)
+
+    def test_background_renderer(self):
+        try:
+            import graphviz
+        except ImportError:
+            self.skipTest('graphviz is not installed')
+        visualization_data = SndpGraph('instance_name', 5, 3, 1, 1).visualization_data()
+        directory = Path(tempfile.mkdtemp())
+        renderer = BackgroundRenderer(max_workers=2, max_pending=1)
+        for i in range(3):
+            renderer.submit(i, visualization_data, str(directory / f'instance_{i}'))
+        (directory / 'file').write_text('')
+        renderer.submit('wrong directory', visualization_data, str(directory / 'file' / 'instance'))
+        failed = dict(renderer.join())
+        self.assertIn('wrong directory', failed)
+        # the images fail without the dot executable
+        self.assertEqual(sorted(renderer.finished(), key=str),
+                         sorted([(key, key in failed) for key in [0, 1, 2, 'wrong directory']], key=str))
+        self.assertEqual(renderer.finished(), [])
+        for i in range(3): # the source is written even without the dot executable
+            self.assertTrue((directory / f'instance_{i}').is_file())
+        shutil.rmtree(directory)
+
+    @patch('sndpgen.command_line.render_visualization', render_visualization_source)
+    def test_command_visualization(self):
+        argv = sys.argv
+        try:
+            sys.argv = argv[:1] + ['--yaml', 'param.yaml', '--force']
+            self.assertTrue(generate_command())
+            manifest = json.loads(Path(STR_MANIFEST_FILENAME).read_text())
+            # the rendered visualization is hashed after the join
+            self.assertIn('SNDP_5_3_0_', manifest['SNDP_5_3_0_']['files'])
+        finally:
+            sys.argv = argv
+
+    def test_command_visualization_manifest(self):
+        # the manifest entry of a combination is written after its visualization is rendered,
+        # so a run interrupted before does not skip the combination without the visualization
+        in_manifest = []
+        def render_visualization(visualization_data, format='jpg', to_file=None):
+            in_manifest.append(to_file in read_manifest())
+        Path(STR_MANIFEST_FILENAME).unlink(missing_ok=True)
+        argv = sys.argv
+        try:
+            sys.argv = argv[:1] + ['--yaml', 'param.yaml', '--force']
+            with patch('sndpgen.command_line.render_visualization', render_visualization):
+                self.assertTrue(generate_command())
+        finally:
+            sys.argv = argv
+        self.assertTrue(in_manifest)
+        self.assertFalse(any(in_manifest))
+        manifest = read_manifest()
+        self.assertIn('SNDP_5_3_0_', manifest)
+
+    def test_command_visualization_failed(self):
+        # a combination with a failed visualization is not recorded, the next run generates it again
+        def failed_render_visualization(visualization_data, format='jpg', to_file=None):
+            if to_file == 'SNDP_5_3_0_':
+                raise RuntimeError('no dot executable')
+            return render_visualization_source(visualization_data, format, to_file)
+        rendered = []
+        def render_visualization(visualization_data, format='jpg', to_file=None):
+            rendered.append(to_file)
+            return render_visualization_source(visualization_data, format, to_file)
+        Path(STR_MANIFEST_FILENAME).unlink(missing_ok=True)
+        argv = sys.argv
+        try:
+            sys.argv = argv[:1] + ['--yaml', 'param.yaml']
+            with patch('sndpgen.command_line.render_visualization', failed_render_visualization):
+                self.assertTrue(generate_command())
+            manifest = read_manifest()
+            self.assertNotIn('SNDP_5_3_0_', manifest)
+            self.assertIn('SNDP_5_3_1_', manifest)
+            with patch('sndpgen.command_line.render_visualization', render_visualization):
+                self.assertTrue(generate_command())
+        finally:
+            sys.argv = argv
+        self.assertListEqual(rendered, ['SNDP_5_3_0_'])
+        self.assertIn('SNDP_5_3_0_', read_manifest())
 
     def test_command_line(self):
-        Timer('test_command_line').start()
         filename = 'param.yaml'
         sys.argv = sys.argv + ['--yaml', filename]
-        self.assertTrue(generate_command())
-        Timer('test_command_line').pause()
-        Timer.report()
+        with Profiler() as profiler:
+            self.assertTrue(generate_command())
+        print(f"test_command_line: {profiler.root.wall:0.4f}")
 
     def test_command_default_yaml(self):
         self.assertTrue(generate_command())
@@ -93,6 +922,8 @@ class TestCommandLineSndpGen(TestCase):
     def tearDownClass(cls):
         for file in Path().glob("SNDP_*"):
              file.unlink()
+        shutil.rmtree(SndpCache.STR_DEFAULT_DIRECTORY, ignore_errors=True)
+        Path(STR_MANIFEST_FILENAME).unlink(missing_ok=True)
 
 
 try: